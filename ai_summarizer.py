@@ -1,13 +1,121 @@
 import os
-import google.generativeai as genai
+import re
+import time
+import threading
 import logging
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
 from models import User, Tag, Category, db
+from content_cleaner import estimate_tokens, prepare_content
+from rate_limiter import TokenBucket, CircuitBreaker
+from metrics import LLM_CALLS, LLM_CALL_SECONDS, LLM_TOKENS
 
-# Configure logging and Gemini API
+# Configure logging
 logger = logging.getLogger(__name__)
-genai.configure(api_key=os.environ['GOOGLE_GEMINI_API_KEY'])
-model = genai.GenerativeModel('gemini-2.0-flash')
+
+# The Gemini client is configured on the first summary, not at import time
+_model = None
+_model_lock = threading.Lock()
+
+# Maximum estimated tokens of article content included in a summary prompt
+SUMMARY_TOKEN_BUDGET = int(os.environ.get('SUMMARY_TOKEN_BUDGET', 2000))
+
+# Client-side throttling shared by every thread that calls Gemini
+GEMINI_REQUESTS_PER_MINUTE = int(
+    os.environ.get('GEMINI_REQUESTS_PER_MINUTE', 60))
+GEMINI_RATE_LIMIT_TIMEOUT = float(
+    os.environ.get('GEMINI_RATE_LIMIT_TIMEOUT', 120))  # seconds
+gemini_rate_limiter = TokenBucket(GEMINI_REQUESTS_PER_MINUTE,
+                                  burst=int(os.environ.get('GEMINI_BURST', 5)))
+gemini_circuit_breaker = CircuitBreaker(
+    'gemini',
+    failure_threshold=int(os.environ.get('GEMINI_CIRCUIT_FAILURES', 5)),
+    reset_timeout=float(os.environ.get('GEMINI_CIRCUIT_RESET_SECONDS', 300)))
+
+# Matches the retry hint in quota errors, e.g. "retry_delay { seconds: 30 }"
+_RETRY_DELAY_RE = re.compile(
+    r'(?:retry_delay\s*\{\s*seconds:\s*|retry in\s+)(\d+(?:\.\d+)?)',
+    re.IGNORECASE)
+
+
+class SummarySkipped(Exception):
+    """Raised when no Gemini call was made (circuit open or no rate limit slot)."""
+
+
+def get_model():
+    """Return the shared Gemini model, configuring the client on first use"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.environ['GOOGLE_GEMINI_API_KEY'])
+                _model = genai.GenerativeModel('gemini-2.0-flash')
+    return _model
+
+
+def record_token_usage(prompt_tokens: int, response_tokens: int) -> None:
+    """Add the token counts of one Gemini call to the token metrics"""
+    LLM_TOKENS.inc(prompt_tokens, kind='prompt')
+    LLM_TOKENS.inc(response_tokens, kind='response')
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Extract the server's retry hint from a quota error, if present"""
+    for detail in getattr(error, 'details', None) or []:
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None and getattr(delay, 'seconds', None) is not None:
+            return delay.seconds + getattr(delay, 'nanos', 0) / 1e9
+
+    match = _RETRY_DELAY_RE.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def _call_gemini(prompt: str):
+    """Send a prompt to Gemini through the shared rate limiter and circuit breaker.
+
+    Raises SummarySkipped without calling the API when the circuit is open or
+    no request slot became available in time.
+    """
+    # Checked first so an open circuit does not wait for, or use up, a slot
+    if not gemini_circuit_breaker.allow_request():
+        logger.warning("Gemini circuit open, skipping summary generation")
+        LLM_CALLS.inc(outcome='circuit_open')
+        raise SummarySkipped('Gemini circuit open')
+
+    if not gemini_rate_limiter.acquire(timeout=GEMINI_RATE_LIMIT_TIMEOUT):
+        logger.warning("Timed out waiting for a Gemini rate limit slot")
+        LLM_CALLS.inc(outcome='throttled')
+        gemini_circuit_breaker.release()
+        raise SummarySkipped('No Gemini rate limit slot')
+
+    from google.api_core import exceptions as google_exceptions
+
+    model = get_model()
+    start = time.perf_counter()
+    try:
+        response = model.generate_content(prompt)
+    except (google_exceptions.ResourceExhausted,
+            google_exceptions.TooManyRequests) as e:
+        LLM_CALLS.inc(outcome='rate_limited')
+        retry_after = _retry_after_seconds(e)
+        gemini_rate_limiter.penalize(retry_after)
+        if retry_after and retry_after > GEMINI_RATE_LIMIT_TIMEOUT:
+            # The quota will not recover soon, stop calling until it does
+            gemini_circuit_breaker.trip(retry_after)
+        else:
+            gemini_circuit_breaker.record_failure()
+        raise
+    except Exception:
+        LLM_CALLS.inc(outcome='error')
+        gemini_circuit_breaker.record_failure()
+        raise
+    finally:
+        LLM_CALL_SECONDS.observe(time.perf_counter() - start)
+
+    LLM_CALLS.inc(outcome='success')
+    gemini_circuit_breaker.record_success()
+    gemini_rate_limiter.reward()
+    return response
 
 
 def get_or_create_tag(name: str) -> Optional[Tag]:
@@ -45,8 +153,39 @@ def get_or_create_category(name: str,
         return None
 
 
-def generate_summary(title: str, content: str,
-                     user: User) -> Optional[Dict[str, str]]:
+def apply_summary(article, summary_result: Dict) -> Tuple[List[Tag], List[Category]]:
+    """Store a generate_summary result on an article and mark it processed
+
+    Returns the tags and categories added to the article.
+    """
+    article.summary = summary_result['summary']
+    article.critique = summary_result.get('critique')
+
+    tags = []
+    for tag_name in summary_result.get('tags', []):
+        tag = get_or_create_tag(tag_name)
+        if tag:
+            article.tags.append(tag)
+            tags.append(tag)
+
+    categories = []
+    for category_name in summary_result.get('categories', []):
+        category = get_or_create_category(category_name)
+        if category:
+            article.categories.append(category)
+            categories.append(category)
+
+    article.processed = True
+    return tags, categories
+
+
+def generate_summary(title: str, content: str, user: User,
+                     raise_skipped: bool = False) -> Optional[Dict[str, str]]:
+    """Summarize an article for the user; None if it could not be summarized.
+
+    With raise_skipped, SummarySkipped is raised instead when Gemini was not
+    called at all, so callers can tell it apart from a failed call.
+    """
     try:
         # Determine summary length based on user preference
         length_guide = {
@@ -62,6 +201,9 @@ def generate_summary(title: str, content: str,
         focus_areas_str = '\n'.join(f'   - {area.strip()}'
                                     for area in focus_areas)
 
+        # Strip HTML and boilerplate and keep the content within the token budget
+        content = prepare_content(title, content, SUMMARY_TOKEN_BUDGET)
+
         # Prepare the prompt for summary, critique, tags, and categories
         prompt = f"""
         Article Title: {title}
@@ -92,9 +234,20 @@ def generate_summary(title: str, content: str,
         if user.include_critique:
             prompt += "\nCritique: [critique analyzing objectivity, evidence, and potential biases]"
 
-        response = model.generate_content(prompt)
+        response = _call_gemini(prompt)
         response_text = response.text
 
+        # Prefer the API's own token counts and fall back to an estimate
+        usage = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(usage, 'prompt_token_count',
+                                None) or estimate_tokens(prompt)
+        response_tokens = getattr(usage, 'candidates_token_count',
+                                  None) or estimate_tokens(response_text)
+        record_token_usage(prompt_tokens, response_tokens)
+        logger.info(
+            f"Summary generated for '{title}': {prompt_tokens} prompt tokens, {response_tokens} response tokens"
+        )
+
         # Parse the response
         parts = {}
         current_section = None
@@ -142,6 +295,10 @@ def generate_summary(title: str, content: str,
             'categories': parts.get('categories', [])
         }
 
+    except SummarySkipped:
+        if raise_skipped:
+            raise
+        return None
     except Exception as e:
         logger.error(f"Error generating summary: {str(e)}")
         return None
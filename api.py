@@ -0,0 +1,156 @@
+"""Read-only JSON API for a user's feeds, articles and summaries.
+
+Article and summary listings carry strong ETags derived from the user's
+content_version, which is incremented whenever their articles change. A
+request whose If-None-Match matches is answered with 304 Not Modified after
+a single version lookup, before any article is loaded. The feed listing
+changes with every poll, so its ETag is a hash of the response body.
+"""
+import hashlib
+import logging
+from functools import wraps
+
+from flask import Blueprint, Response, jsonify, request
+from flask_login import current_user
+from sqlalchemy import desc, nullslast
+
+from app import db
+from models import User, Feed, Article, Tag, Category
+from read_models import ARTICLE_CARD_COLUMNS, ARTICLE_DETAIL_COLUMNS, with_load_profile, article_views
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+API_DEFAULT_PER_PAGE = 20
+API_MAX_PER_PAGE = 100
+# Responses are per user and must be revalidated before reuse
+CACHE_CONTROL = 'private, no-cache'
+
+
+@bp.before_request
+def require_login():
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Authentication required'}), 401
+
+
+def _cacheable(response):
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.vary.add('Cookie')
+    return response
+
+
+def versioned(view):
+    """Serve the view with an ETag based on the user's content_version."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Read from the database; the logged-in user object may be older
+        version = db.session.query(User.content_version).filter(
+            User.id == current_user.id).scalar()
+        key = f"{current_user.id}:{version}:{request.path}:{sorted(request.args.items(multi=True))}"
+        etag = hashlib.sha256(key.encode()).hexdigest()[:32]
+
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = view(*args, **kwargs)
+        response.set_etag(etag)
+        return _cacheable(response)
+
+    return wrapper
+
+
+def _page_args():
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = request.args.get('per_page', API_DEFAULT_PER_PAGE, type=int)
+    return page, min(max(per_page, 1), API_MAX_PER_PAGE)
+
+
+def _article_query(columns):
+    """The user's articles, without duplicates, filtered by the request args."""
+    query = with_load_profile(Article.query.join(Feed), columns).filter(
+        Feed.user_id == current_user.id, Feed.deleted_at.is_(None),
+        Article.duplicate_of_id.is_(None))
+
+    feed_id = request.args.get('feed_id', type=int)
+    if feed_id:
+        query = query.filter(Article.feed_id == feed_id)
+    tag = request.args.get('tag')
+    if tag:
+        query = query.join(Article.tags).filter(Tag.name == Tag.clean_tag_name(tag))
+    category = request.args.get('category')
+    if category:
+        query = query.join(Article.categories).filter(
+            Category.name == category.lower().strip())
+    return query.order_by(nullslast(desc(Article.published_date)), desc(Article.id))
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _paginated(query, serialize):
+    page, per_page = _page_args()
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    return jsonify({
+        'items': [serialize(view) for view in article_views(pagination.items)],
+        'page': pagination.page,
+        'per_page': pagination.per_page,
+        'total': pagination.total,
+        'pages': pagination.pages,
+    })
+
+
+def _article_json(view):
+    return {
+        'id': view.id,
+        'title': view.title,
+        'url': view.url,
+        'feed_title': view.feed_title,
+        'published_date': _isoformat(view.published_date),
+        'created_at': _isoformat(view.created_at),
+        'summarized': view.summary is not None,
+        'tags': view.tags,
+        'categories': view.categories,
+    }
+
+
+def _summary_json(view):
+    data = _article_json(view)
+    del data['summarized']
+    data['summary'] = view.summary  # markdown
+    data['critique'] = view.critique
+    return data
+
+
+@bp.route('/feeds')
+def feeds():
+    feeds = Feed.query.filter_by(user_id=current_user.id, deleted_at=None).order_by(Feed.id).all()
+    response = jsonify({
+        'items': [{
+            'id': feed.id,
+            'title': feed.title,
+            'url': feed.url,
+            'status': feed.status,
+            'error_message': feed.error_message,
+            'last_checked': _isoformat(feed.last_checked),
+            'last_successful_process': _isoformat(feed.last_successful_process),
+            'total_articles_processed': feed.total_articles_processed,
+        } for feed in feeds]
+    })
+    response.add_etag()
+    return _cacheable(response.make_conditional(request))
+
+
+@bp.route('/articles')
+@versioned
+def articles():
+    return _paginated(_article_query(ARTICLE_CARD_COLUMNS), _article_json)
+
+
+@bp.route('/summaries')
+@versioned
+def summaries():
+    query = _article_query(ARTICLE_DETAIL_COLUMNS).filter(Article.processed == True)
+    return _paginated(query, _summary_json)
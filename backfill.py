@@ -0,0 +1,186 @@
+"""Resumable backfill of articles whose summary generation failed."""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from app import db
+from models import User, Feed, Article, ContentBlob, JobCheckpoint
+from ai_summarizer import (generate_summary, apply_summary, gemini_circuit_breaker,
+                           SummarySkipped)
+from topic_counts import add_article_topics
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'backfill_unprocessed_articles'
+BACKFILL_BATCH_SIZE = int(os.environ.get('BACKFILL_BATCH_SIZE', 50))
+BACKFILL_CONCURRENCY = int(os.environ.get('BACKFILL_CONCURRENCY', 4))
+# Articles that failed this many times are left alone
+BACKFILL_MAX_ATTEMPTS = int(os.environ.get('BACKFILL_MAX_ATTEMPTS', 5))
+
+
+def _load_checkpoint():
+    checkpoint = db.session.get(JobCheckpoint, CHECKPOINT_NAME)
+    if not checkpoint:
+        checkpoint = JobCheckpoint(name=CHECKPOINT_NAME, value='0')
+        db.session.add(checkpoint)
+    return checkpoint
+
+
+def count_pending_articles():
+    """Return the number of unprocessed articles the backfill will still try."""
+    return Article.query.filter(
+        Article.processed == False,
+        Article.summary_attempts < BACKFILL_MAX_ATTEMPTS).count()
+
+
+def _user_preferences(user_ids):
+    """Load the summary preferences of the given users as plain objects.
+
+    generate_summary runs in worker threads, which must not touch the
+    session, so they get detached snapshots instead of User instances.
+    """
+    users = User.query.filter(User.id.in_(user_ids)).all()
+    return {
+        user.id: SimpleNamespace(summary_length=user.summary_length,
+                                 include_critique=user.include_critique,
+                                 focus_areas=user.focus_areas)
+        for user in users
+    }
+
+
+def backfill_unprocessed_articles(batch_size=BACKFILL_BATCH_SIZE,
+                                  concurrency=BACKFILL_CONCURRENCY,
+                                  max_batches=None):
+    """Summarize articles left unprocessed by earlier feed processing runs.
+
+    Articles are scanned in id order in batches of `batch_size`, summarized
+    with up to `concurrency` parallel Gemini calls and committed together
+    with the checkpoint, so an interrupted run resumes where it stopped.
+    When the scan reaches the end the checkpoint wraps around to the start.
+    The run stops early if the Gemini circuit breaker opens.
+
+    Args:
+        batch_size: Number of articles summarized per batch.
+        concurrency: Maximum number of concurrent summary calls.
+        max_batches: Optional limit on the number of batches in this run.
+
+    Returns:
+        dict: Counts of summarized, failed and remaining articles and the
+              throughput in articles per second.
+    """
+    start_time = time.time()
+    summarized = 0
+    failed = 0
+    batches = 0
+
+    checkpoint = _load_checkpoint()
+    last_id = int(checkpoint.value or 0)
+    logger.info(f"Starting article backfill after article ID {last_id}")
+
+    try:
+        while max_batches is None or batches < max_batches:
+            if gemini_circuit_breaker.is_open():
+                logger.warning("Gemini circuit breaker is open, pausing backfill")
+                break
+
+            rows = db.session.query(
+                Article.id, Article.title, ContentBlob.data,
+                Article.legacy_content, Feed.user_id).join(
+                    Feed, Article.feed_id == Feed.id).outerjoin(
+                        ContentBlob,
+                        Article.content_hash == ContentBlob.hash).filter(
+                    Article.processed == False,
+                    Feed.deleted_at.is_(None),
+                    Article.summary_attempts < BACKFILL_MAX_ATTEMPTS,
+                    Article.id > last_id).order_by(Article.id).limit(
+                        batch_size).all()
+
+            if not rows:
+                # Reached the end, start the next pass from the beginning
+                last_id = 0
+                checkpoint.value = '0'
+                db.session.commit()
+                break
+
+            preferences = _user_preferences({row.user_id for row in rows})
+
+            def summarize(row):
+                """Return (summary or None, whether Gemini was called)."""
+                user = preferences.get(row.user_id)
+                if not user:
+                    return None, True
+                content = ContentBlob.decode(row.data) if row.data else row.legacy_content
+                try:
+                    return generate_summary(row.title, content or '', user,
+                                            raise_skipped=True), True
+                except SummarySkipped:
+                    return None, False
+
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(summarize, rows))
+
+            # Only articles Gemini was actually called for count as attempts;
+            # skipped ones (circuit open, no rate limit slot) are retried
+            skipped_ids = []
+            changed_users = set()
+            topics = []
+            for row, (summary_result, called) in zip(rows, results):
+                article = db.session.get(Article, row.id)
+                if not article:
+                    continue
+                if not called:
+                    skipped_ids.append(row.id)
+                elif summary_result:
+                    topics.append((row.user_id, *apply_summary(article, summary_result)))
+                    changed_users.add(row.user_id)
+                    summarized += 1
+                else:
+                    failed += 1
+                if called:
+                    article.summary_attempts = (article.summary_attempts or 0) + 1
+
+            if skipped_ids:
+                # Resume from the first article that was skipped
+                last_id = min(skipped_ids) - 1
+            else:
+                last_id = rows[-1].id
+
+            # New tags and categories need their ids
+            db.session.flush()
+            for user_id, tags, categories in topics:
+                add_article_topics(user_id, [tag.id for tag in tags],
+                                   [category.id for category in categories])
+            User.bump_content_version(changed_users)
+            checkpoint.value = str(last_id)
+            db.session.commit()
+            batches += 1
+
+            elapsed = time.time() - start_time
+            logger.info(
+                f"Backfill batch {batches}: {summarized} summarized, {failed} failed, "
+                f"checkpoint at article ID {last_id}, "
+                f"{summarized / elapsed if elapsed else 0:.2f} articles/s")
+
+            # Retrying the same batch right away would only be skipped again
+            if not any(called for _, called in results):
+                logger.warning("Gemini unavailable for a whole batch, pausing backfill")
+                break
+    except Exception as e:
+        logger.error(f"Error in backfill_unprocessed_articles: {str(e)}")
+        db.session.rollback()
+        raise
+
+    elapsed = time.time() - start_time
+    stats = {
+        'summarized': summarized,
+        'failed': failed,
+        'remaining': count_pending_articles(),
+        'articles_per_second': summarized / elapsed if elapsed else 0.0,
+    }
+    logger.info(
+        f"Backfill finished in {elapsed:.2f}s: {stats['summarized']} summarized, "
+        f"{stats['failed']} failed, {stats['remaining']} remaining, "
+        f"{stats['articles_per_second']:.2f} articles/s")
+    return stats
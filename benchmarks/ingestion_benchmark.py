@@ -0,0 +1,273 @@
+"""Offline benchmark for the feed ingestion pipeline.
+
+Serves synthetic RSS and Atom feeds from a local HTTP server, replaces the
+Gemini summarizer with a fake of configurable latency and runs process_feeds
+against SQLite (default) or any database given with --database-url. Reports feeds/sec, articles/sec, per-feed
+latency percentiles, SQL statements per feed and peak memory.
+
+Usage:
+    python benchmarks/ingestion_benchmark.py --feeds 50 --entries 200
+    python benchmarks/ingestion_benchmark.py --database-url postgresql://localhost/rss_bench --json
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PARAGRAPH = ("<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do "
+             "eiusmod tempor incididunt ut labore et dolore magna aliqua.</p>")
+
+
+def build_feed(feed_id, entries, entry_size, feed_format):
+    """Render a synthetic feed document with `entries` items."""
+    body = PARAGRAPH * max(1, entry_size // len(PARAGRAPH))
+    now = datetime.now(timezone.utc)
+
+    if feed_format == 'atom':
+        items = ''.join(
+            f"<entry><title>Feed {feed_id} entry {i}</title>"
+            f"<link rel=\"alternate\" href=\"https://bench.example/{feed_id}/{i}\"/>"
+            f"<id>urn:bench:{feed_id}:{i}</id>"
+            f"<published>{(now - timedelta(minutes=i)).isoformat()}</published>"
+            f"<content type=\"html\"><![CDATA[{body}]]></content></entry>"
+            for i in range(entries))
+        return (f"<?xml version=\"1.0\" encoding=\"utf-8\"?>"
+                f"<feed xmlns=\"http://www.w3.org/2005/Atom\">"
+                f"<title>Benchmark feed {feed_id}</title>{items}</feed>").encode()
+
+    items = ''.join(
+        f"<item><title>Feed {feed_id} entry {i}</title>"
+        f"<link>https://bench.example/{feed_id}/{i}</link>"
+        f"<guid>bench-{feed_id}-{i}</guid>"
+        f"<pubDate>{format_datetime(now - timedelta(minutes=i))}</pubDate>"
+        f"<description><![CDATA[{body}]]></description></item>"
+        for i in range(entries))
+    return (f"<?xml version=\"1.0\" encoding=\"utf-8\"?><rss version=\"2.0\"><channel>"
+            f"<title>Benchmark feed {feed_id}</title>{items}</channel></rss>").encode()
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """Serves /feed/<id>?entries=N&size=B&format=rss|atom&latency=ms."""
+
+    cache = {}
+    cache_lock = threading.Lock()
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        feed_id = parsed.path.rsplit('/', 1)[-1]
+        key = (feed_id, params.get('entries'), params.get('size'),
+               params.get('format'))
+
+        with self.cache_lock:
+            document = self.cache.get(key)
+        if document is None:
+            document = build_feed(feed_id, int(params.get('entries', 20)),
+                                  int(params.get('size', 2000)),
+                                  params.get('format', 'rss'))
+            with self.cache_lock:
+                self.cache[key] = document
+
+        time.sleep(int(params.get('latency', 0)) / 1000)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(document)))
+        self.end_headers()
+        self.wfile.write(document)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_feed_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--feeds', type=int, default=20, help='number of feeds')
+    parser.add_argument('--users', type=int, default=5, help='number of users owning the feeds')
+    parser.add_argument('--entries', type=int, default=50, help='entries per feed document')
+    parser.add_argument('--entry-size', type=int, default=2000, help='approximate bytes of HTML per entry')
+    parser.add_argument('--format', choices=['rss', 'atom', 'mixed'], default='mixed')
+    parser.add_argument('--feed-latency', type=int, default=0, help='feed server latency in ms')
+    parser.add_argument('--summary-latency', type=int, default=0, help='fake summarizer latency in ms')
+    parser.add_argument('--parse-mode', choices=['inline', 'process', 'stream'], default=None)
+    parser.add_argument('--rounds', type=int, default=2,
+                        help='processing rounds; later rounds measure the no-new-articles path')
+    parser.add_argument('--database-url', default=None,
+                        help='database to use (default: temporary SQLite file); it is reset')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='report peak Python heap usage via tracemalloc (slower)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    temp_dir = None
+    if not args.database_url:
+        temp_dir = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite:///{os.path.join(temp_dir.name, 'bench.db')}"
+
+    # The app reads its configuration at import time
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('GOOGLE_GEMINI_API_KEY', 'benchmark')
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    from sqlalchemy import event
+    from app import app, db, scheduler
+    from models import User, Feed, Article
+    import feed_processor
+    from feed_parser import clear_response_cache
+
+    # Only the benchmark may drive processing
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+
+    summary_latency = args.summary_latency / 1000
+
+    def fake_generate_summary(title, content, user):
+        time.sleep(summary_latency)
+        return {
+            'summary': f"Summary of {title}",
+            'critique': None,
+            'tags': ['benchmark', 'synthetic'],
+            'categories': ['Technology'],
+        }
+
+    feed_processor.generate_summary = fake_generate_summary
+
+    server = start_feed_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    statement_count = 0
+
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            nonlocal statement_count
+            statement_count += 1
+
+        db.drop_all()
+        db.create_all()
+
+        users = []
+        for i in range(args.users):
+            user = User(username=f"bench{i}", email=f"bench{i}@bench.example",
+                        email_verified=True)
+            user.set_password('benchmark')
+            users.append(user)
+        db.session.add_all(users)
+        db.session.commit()
+
+        for i in range(args.feeds):
+            feed_format = args.format
+            if feed_format == 'mixed':
+                feed_format = 'atom' if i % 2 else 'rss'
+            url = (f"{base_url}/feed/{i}?entries={args.entries}&size={args.entry_size}"
+                   f"&format={feed_format}&latency={args.feed_latency}")
+            db.session.add(Feed(url=url, title=f"Feed {i}",
+                                user_id=users[i % len(users)].id))
+        db.session.commit()
+        feed_ids = [feed_id for (feed_id,) in db.session.query(Feed.id).order_by(Feed.id)]
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    rounds = []
+    for round_number in range(1, args.rounds + 1):
+        with app.app_context():
+            # Make every feed due for processing
+            db.session.execute(db.text("UPDATE feed SET last_checked = NULL"))
+            db.session.commit()
+            articles_before = Article.query.count()
+        # Every round fetches and parses the feeds instead of reusing responses
+        clear_response_cache()
+
+        latencies = []
+        statements_before = statement_count
+        round_start = time.perf_counter()
+        for feed_id in feed_ids:
+            with app.app_context():
+                feed = db.session.get(Feed, feed_id)
+                feed_start = time.perf_counter()
+                feed_processor.process_feeds([feed], parse_mode=args.parse_mode)
+                latencies.append(time.perf_counter() - feed_start)
+        elapsed = time.perf_counter() - round_start
+
+        with app.app_context():
+            new_articles = Article.query.count() - articles_before
+
+        rounds.append({
+            'round': round_number,
+            'feeds': len(feed_ids),
+            'new_articles': new_articles,
+            'seconds': round(elapsed, 3),
+            'feeds_per_sec': round(len(feed_ids) / elapsed, 2) if elapsed else 0,
+            'articles_per_sec': round(new_articles / elapsed, 2) if elapsed else 0,
+            'p50_feed_ms': round(percentile(latencies, 50) * 1000, 1),
+            'p95_feed_ms': round(percentile(latencies, 95) * 1000, 1),
+            'mean_feed_ms': round(statistics.mean(latencies) * 1000, 1) if latencies else 0,
+            'queries_per_feed': round((statement_count - statements_before) / len(feed_ids), 1)
+            if feed_ids else 0,
+        })
+
+    results = {
+        'config': {k: v for k, v in vars(args).items() if k != 'json'},
+        'rounds': rounds,
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if args.trace_memory:
+        results['peak_python_heap_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+        tracemalloc.stop()
+
+    server.shutdown()
+    if temp_dir:
+        temp_dir.cleanup()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Database: {args.database_url}")
+    print(f"Feeds: {args.feeds}, entries/feed: {args.entries}, entry size: {args.entry_size}B, "
+          f"parse mode: {args.parse_mode or 'default'}")
+    for r in rounds:
+        print(f"Round {r['round']}: {r['feeds_per_sec']} feeds/s, {r['articles_per_sec']} articles/s, "
+              f"p50 {r['p50_feed_ms']}ms, p95 {r['p95_feed_ms']}ms, "
+              f"{r['queries_per_feed']} queries/feed, {r['new_articles']} new articles")
+    print(f"Peak RSS: {results['peak_rss_mb']} MB")
+    if 'peak_python_heap_mb' in results:
+        print(f"Peak Python heap: {results['peak_python_heap_mb']} MB")
+
+
+if __name__ == '__main__':
+    main()
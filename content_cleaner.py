@@ -0,0 +1,149 @@
+"""Turn raw feed HTML into compact plain text for LLM prompts."""
+import math
+import re
+from html.parser import HTMLParser
+
+# Roughly four characters per token for English text with Gemini tokenizers
+CHARS_PER_TOKEN = 4
+
+# Elements whose contents are never part of the article text
+_SKIPPED_TAGS = {
+    'script', 'style', 'noscript', 'iframe', 'svg', 'nav', 'footer', 'aside',
+    'form', 'button', 'figure'
+}
+# Elements that start a new paragraph in the extracted text
+_BLOCK_TAGS = {
+    'p', 'div', 'br', 'li', 'ul', 'ol', 'section', 'article', 'header',
+    'blockquote', 'pre', 'table', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'
+}
+
+# Paragraphs matching these patterns are feed and CMS boilerplate
+_BOILERPLATE_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in (
+        r'^the post .* appeared first on',
+        r'^(this|the) (article|entry|post) (was )?(originally )?(published|appeared)',
+        r'^(continue|keep) reading',
+        r'^read (more|the (full|rest))',
+        r'^(share|tweet|email|print)( this)?( (article|post|story))?:?$',
+        r'^(subscribe|sign up|follow us|join our newsletter)\b',
+        r'^(related|recommended)( (posts|articles|stories))?:?$',
+        r'^advertisement$',
+        r'^(comments?|\d+ comments?)$',
+        r'^\[?(\.\.\.|…)\]?$',
+    )
+]
+
+_WORD_RE = re.compile(r'[a-z0-9]{3,}')
+
+
+class _TextExtractor(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs = []
+        self._current = []
+        self._skip_depth = 0
+
+    def _flush(self):
+        text = ' '.join(''.join(self._current).split())
+        if text:
+            self.paragraphs.append(text)
+        self._current = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._current.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def estimate_tokens(text):
+    """Approximate the number of tokens in text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def html_to_paragraphs(html):
+    """Strip HTML and boilerplate, returning the remaining text paragraphs."""
+    if not html:
+        return []
+
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+
+    return [
+        paragraph for paragraph in extractor.paragraphs
+        if not any(pattern.search(paragraph) for pattern in _BOILERPLATE_PATTERNS)
+    ]
+
+
+def _truncate_to_tokens(text, max_tokens):
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(' ', 0, max_chars)
+    return text[:cut if cut > 0 else max_chars].rstrip() + ' …'
+
+
+def prepare_content(title, content, max_tokens):
+    """Reduce article HTML to plain text that fits within a token budget.
+
+    The lead paragraph is always kept. When the article is over budget the
+    remaining paragraphs are ranked by how many title terms they mention and
+    the best ones are kept, in their original order, until the budget is used.
+
+    Args:
+        title: The article title, used to rank passages by relevance.
+        content: The raw article HTML from the feed.
+        max_tokens: The maximum estimated number of tokens to return.
+
+    Returns:
+        str: The prepared plain-text content.
+    """
+    paragraphs = html_to_paragraphs(content)
+    if not paragraphs:
+        return ''
+
+    text = '\n\n'.join(paragraphs)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    lead = _truncate_to_tokens(paragraphs[0], max_tokens)
+    budget = max_tokens - estimate_tokens(lead)
+
+    title_terms = set(_WORD_RE.findall((title or '').lower()))
+
+    def relevance(item):
+        position, paragraph = item
+        words = _WORD_RE.findall(paragraph.lower())
+        if not words:
+            return (0, -position)
+        hits = sum(1 for word in words if word in title_terms)
+        # Prefer dense, early passages when relevance is tied
+        return (hits / math.sqrt(len(words)), -position)
+
+    selected = []
+    for position, paragraph in sorted(enumerate(paragraphs[1:], start=1),
+                                      key=relevance,
+                                      reverse=True):
+        cost = estimate_tokens(paragraph)
+        if cost <= budget:
+            selected.append((position, paragraph))
+            budget -= cost
+
+    kept = [lead] + [paragraph for _, paragraph in sorted(selected)]
+    return '\n\n'.join(kept)
@@ -0,0 +1,95 @@
+"""Maintenance of the content-addressed article content store.
+
+Article content is stored once per distinct text in ContentBlob, compressed
+with zlib and referenced by Article.content_hash. This module moves content
+still held in the legacy article.content column into blobs and removes blobs
+no article references any more.
+"""
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists
+
+from app import db
+from models import Article, ContentBlob
+
+logger = logging.getLogger(__name__)
+
+CONTENT_MIGRATION_BATCH_SIZE = int(os.environ.get('CONTENT_MIGRATION_BATCH_SIZE', 200))
+BLOB_GC_BATCH_SIZE = int(os.environ.get('BLOB_GC_BATCH_SIZE', 1000))
+# Recently stored blobs may belong to an article that is not committed yet
+BLOB_GC_GRACE = timedelta(hours=1)
+
+
+def migrate_legacy_content(batch_size=CONTENT_MIGRATION_BATCH_SIZE, pause=0.1):
+    """Move content from the legacy article.content column into ContentBlob.
+
+    Returns:
+        int: The number of articles migrated.
+    """
+    migrated = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.session.query(Article.id, Article.legacy_content).filter(
+                Article.id > last_id, Article.content_hash.is_(None),
+                Article.legacy_content.isnot(None)).order_by(
+                    Article.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            for article_id, text in rows:
+                Article.query.filter(Article.id == article_id).update(
+                    {
+                        Article.content_hash: ContentBlob.store(text) if text else None,
+                        Article.legacy_content: None
+                    },
+                    synchronize_session=False)
+            db.session.commit()
+            migrated += len(rows)
+            last_id = rows[-1].id
+            logger.info(f"Moved content of {migrated} articles to the content store")
+            time.sleep(pause)
+    except Exception as e:
+        logger.error(f"Error in migrate_legacy_content: {str(e)}")
+        db.session.rollback()
+        raise
+    return migrated
+
+
+def collect_orphaned_blobs(batch_size=BLOB_GC_BATCH_SIZE):
+    """Delete content blobs that no article references.
+
+    Returns:
+        int: The number of blobs deleted.
+    """
+    cutoff = datetime.utcnow() - BLOB_GC_GRACE
+    deleted = 0
+    try:
+        while True:
+            hashes = [
+                blob_hash for (blob_hash, ) in db.session.query(
+                    ContentBlob.hash).filter(
+                        ContentBlob.last_stored_at < cutoff,
+                        ~exists().where(Article.content_hash == ContentBlob.hash)).limit(
+                            batch_size)
+            ]
+            if not hashes:
+                break
+            # Re-check in case an article picked a blob up since the select
+            ContentBlob.query.filter(
+                ContentBlob.hash.in_(hashes), ContentBlob.last_stored_at < cutoff,
+                ~exists().where(Article.content_hash == ContentBlob.hash)).delete(
+                    synchronize_session=False)
+            db.session.commit()
+            deleted += len(hashes)
+    except Exception as e:
+        logger.error(f"Error in collect_orphaned_blobs: {str(e)}")
+        db.session.rollback()
+        raise
+
+    if deleted:
+        logger.info(f"Deleted {deleted} unreferenced content blobs")
+    return deleted
@@ -0,0 +1,67 @@
+"""In-memory cache of the data shown on each user's dashboard.
+
+Entries hold the feed count and the rendered article views, expire after
+DASHBOARD_CACHE_TTL seconds and are evicted least recently used first once
+DASHBOARD_CACHE_SIZE users are cached. A user's entry is dropped as soon as
+a commit changes their feeds or articles (see signals.py). Other processes
+do not see that signal, so there the TTL bounds how stale an entry can get.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple
+
+from read_models import ArticleView
+from signals import user_content_changed
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', 300))  # seconds
+DASHBOARD_CACHE_SIZE = int(os.environ.get('DASHBOARD_CACHE_SIZE', 1000))
+
+
+class DashboardData(NamedTuple):
+    feed_count: int
+    articles: List[ArticleView]
+
+
+_cache = OrderedDict()  # user id -> (expiry, DashboardData)
+# Bumped on invalidation so a load that raced with a change is not stored
+_generations = {}
+_lock = threading.Lock()
+
+
+def get_dashboard_data(user_id, load):
+    """Return the cached dashboard data of a user, calling `load()` on a miss."""
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(user_id)
+        if cached is not None and cached[0] > now:
+            _cache.move_to_end(user_id)
+            return cached[1]
+        generation = _generations.get(user_id, 0)
+
+    data = load()
+
+    if DASHBOARD_CACHE_TTL > 0:
+        with _lock:
+            if _generations.get(user_id, 0) == generation:
+                _cache[user_id] = (now + DASHBOARD_CACHE_TTL, data)
+                _cache.move_to_end(user_id)
+                while len(_cache) > DASHBOARD_CACHE_SIZE:
+                    _cache.popitem(last=False)
+    return data
+
+
+def invalidate(user_ids):
+    with _lock:
+        for user_id in user_ids:
+            _cache.pop(user_id, None)
+            _generations[user_id] = _generations.get(user_id, 0) + 1
+
+
+@user_content_changed.connect
+def _on_user_content_changed(sender, user_ids=(), **kwargs):
+    invalidate(user_ids)
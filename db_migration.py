@@ -1,42 +1,219 @@
+"""Versioned schema migrations.
+
+Each migration runs once: applied versions are recorded in the
+schema_migrations table and skipped on later starts, so a normal start only
+reads that table. Tables missing from the database are created from the
+models whenever a migration is pending, so a migration that adds a model only
+needs an entry in MIGRATIONS. Migrations must also be safe on databases that
+were just created from the current models, so they check before they change
+anything.
+"""
 from app import app, db
 import logging
-from sqlalchemy import text
+import time
+from sqlalchemy import inspect, text
 
 logger = logging.getLogger(__name__)
 
+# Serializes migrations when several processes start at once (Postgres only)
+MIGRATION_LOCK_ID = 7245001
+
+
+def _has_column(connection, table, column):
+    return column in {c['name'] for c in inspect(connection).get_columns(table)}
+
+
+def _add_column(connection, table, column, definition):
+    if not _has_column(connection, table, column):
+        connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {definition}'))
+
+
+def create_missing_tables(connection):
+    # Tables for models added since the last migration; run_migration has
+    # already created them, this entry just records the schema change
+    pass
+
+
+def add_feed_webhook_id(connection):
+    _add_column(connection, 'feed', 'webhook_id', 'VARCHAR(100)')
+
+
+def drop_feed_webhook_id_unique(connection):
+    # Several feeds with the same URL share one webhook subscription
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text("ALTER TABLE feed DROP CONSTRAINT IF EXISTS feed_webhook_id_key"))
+    connection.execute(text("UPDATE feed SET webhook_id = NULL WHERE webhook_id = ''"))
+
+
+def add_user_type(connection):
+    _add_column(connection, 'user', 'type', "VARCHAR(20) NOT NULL DEFAULT 'user'")
+
+
+def add_article_summary_attempts(connection):
+    _add_column(connection, 'article', 'summary_attempts', 'INTEGER DEFAULT 0')
+
+
+def add_article_unprocessed_index(connection):
+    # Partial index used by the unprocessed article backfill
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_article_unprocessed ON article (id) WHERE processed = false"))
+
+
+def add_user_article_retention_days(connection):
+    _add_column(connection, 'user', 'article_retention_days', 'INTEGER')
+
+
+def add_article_created_at_index(connection):
+    # Used by the retention job to find old articles
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_article_created_at ON article (created_at)"))
+
+
+def add_article_content_hash(connection):
+    # Existing article.content is moved to content_blob by the nightly retention job
+    _add_column(connection, 'article', 'content_hash', 'VARCHAR(64)')
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_article_content_hash ON article (content_hash)"))
+
+
+def add_article_duplicate_detection(connection):
+    _add_column(connection, 'article', 'canonical_url', 'VARCHAR(500)')
+    _add_column(connection, 'article', 'simhash', 'BIGINT')
+    _add_column(connection, 'article', 'duplicate_of_id',
+                'INTEGER REFERENCES article (id) ON DELETE SET NULL')
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_article_canonical_url ON article (canonical_url)"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_article_duplicate_of_id ON article (duplicate_of_id)"))
+
+
+def add_user_content_version(connection):
+    _add_column(connection, 'user', 'content_version', 'INTEGER NOT NULL DEFAULT 0')
+
+
+def create_topic_counts(connection):
+    # The count tables are new; count the articles summarized so far
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_article_tags_tag_article ON article_tags (tag_id, article_id)"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_article_categories_category_article ON article_categories (category_id, article_id)"))
+    for table, association, key in (('user_tag_count', 'article_tags', 'tag_id'),
+                                     ('user_category_count', 'article_categories', 'category_id')):
+        connection.execute(text(
+            f"INSERT INTO {table} (user_id, {key}, article_count) "
+            f"SELECT feed.user_id, {association}.{key}, COUNT(*) FROM {association} "
+            f"JOIN article ON article.id = {association}.article_id "
+            f"JOIN feed ON feed.id = article.feed_id "
+            f"WHERE article.duplicate_of_id IS NULL "
+            f"GROUP BY feed.user_id, {association}.{key}"))
+
+
+# (table, column, referenced table) of foreign keys that cascade deletes
+_CASCADING_FOREIGN_KEYS = [
+    ('feed', 'user_id', 'user'),
+    ('article', 'feed_id', 'feed'),
+    ('article_tags', 'article_id', 'article'),
+    ('article_tags', 'tag_id', 'tag'),
+    ('article_categories', 'article_id', 'article'),
+    ('article_categories', 'category_id', 'category'),
+]
+
+
+def add_cascading_foreign_keys(connection):
+    if connection.dialect.name != 'postgresql':
+        # SQLite cannot alter constraints; databases created from the
+        # current models already cascade
+        logger.info("Skipping ON DELETE CASCADE migration on a non-PostgreSQL database")
+        return
+
+    inspector = inspect(connection)
+    for table, column, referred in _CASCADING_FOREIGN_KEYS:
+        existing = [fk for fk in inspector.get_foreign_keys(table)
+                    if fk['constrained_columns'] == [column]]
+        if any((fk['options'].get('ondelete') or '').upper() == 'CASCADE' for fk in existing):
+            continue
+        for fk in existing:
+            connection.execute(text(f'ALTER TABLE "{table}" DROP CONSTRAINT "{fk["name"]}"'))
+        connection.execute(text(
+            f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_{column}_fkey" '
+            f'FOREIGN KEY ({column}) REFERENCES "{referred}" (id) ON DELETE CASCADE'))
+
+
+def add_feed_deleted_at(connection):
+    _add_column(connection, 'feed', 'deleted_at', 'TIMESTAMP')
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_feed_deleted_at ON feed (deleted_at)"))
+
+
+def create_webhook_subscription(connection):
+    # Feeds with the same URL already share one webhook id
+    connection.execute(text(
+        "INSERT INTO webhook_subscription (topic, subscription_id, registered_at) "
+        "SELECT url, MIN(webhook_id), CURRENT_TIMESTAMP FROM feed "
+        "WHERE webhook_id IS NOT NULL AND url NOT IN (SELECT topic FROM webhook_subscription) "
+        "GROUP BY url"))
+
+
+def add_webhook_subscription_secret(connection):
+    # Subscriptions without a secret are registered again by the reconciler
+    _add_column(connection, 'webhook_subscription', 'secret', 'VARCHAR(64)')
+
+
+# Append new migrations at the end; never renumber or reorder applied ones
+MIGRATIONS = [
+    (1, 'add_feed_webhook_id', add_feed_webhook_id),
+    (2, 'drop_feed_webhook_id_unique', drop_feed_webhook_id_unique),
+    (3, 'add_user_type', add_user_type),
+    (4, 'add_article_summary_attempts', add_article_summary_attempts),
+    (5, 'add_article_unprocessed_index', add_article_unprocessed_index),
+    (6, 'add_user_article_retention_days', add_user_article_retention_days),
+    (7, 'add_article_created_at_index', add_article_created_at_index),
+    (8, 'add_article_content_hash', add_article_content_hash),
+    # job_checkpoint, feed_poll_result, feed_health_hourly, article_archive, content_blob
+    (9, 'create_missing_tables', create_missing_tables),
+    (10, 'create_import_job', create_missing_tables),
+    # also creates article_simhash_band
+    (11, 'add_article_duplicate_detection', add_article_duplicate_detection),
+    (12, 'add_user_content_version', add_user_content_version),
+    # also creates user_tag_count and user_category_count
+    (13, 'create_topic_counts', create_topic_counts),
+    (14, 'add_cascading_foreign_keys', add_cascading_foreign_keys),
+    (15, 'add_feed_deleted_at', add_feed_deleted_at),
+    # also creates webhook_subscription
+    (16, 'create_webhook_subscription', create_webhook_subscription),
+    (17, 'add_webhook_subscription_secret', add_webhook_subscription_secret),
+]
+
+
 def run_migration():
-    """Run database migrations to update schema."""
+    """Create missing tables and apply migrations that have not run yet.
+
+    Returns:
+        bool: True if the schema is up to date.
+    """
+    start_time = time.time()
     with app.app_context():
         try:
-            # Check if the webhook_id column exists
-            result = db.session.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name='feed' AND column_name='webhook_id'"))
-            webhook_column_exists = result.fetchone() is not None
-            
-            if not webhook_column_exists:
-                logger.info("Adding webhook_id column to feed table")
-                db.session.execute(text("ALTER TABLE feed ADD COLUMN webhook_id VARCHAR(100) UNIQUE"))
-                db.session.commit()
-                logger.info("Migration complete: Added webhook_id column to feed table")
-            else:
-                logger.info("webhook_id column already exists in feed table")
-            
-            # Check if the type column exists in the user table
-            result = db.session.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name='user' AND column_name='type'"))
-            type_column_exists = result.fetchone() is not None
-            
-            if not type_column_exists:
-                logger.info("Adding type column to user table")
-                db.session.execute(text("ALTER TABLE \"user\" ADD COLUMN type VARCHAR(20) NOT NULL DEFAULT 'user'"))
-                db.session.commit()
-                logger.info("Migration complete: Added type column to user table")
-            else:
-                logger.info("type column already exists in user table")
-                
-            logger.info("Database migration completed successfully")
+            with db.engine.begin() as connection:
+                if connection.dialect.name == 'postgresql':
+                    connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {'id': MIGRATION_LOCK_ID})
+                connection.execute(text(
+                    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                    "version INTEGER PRIMARY KEY, "
+                    "name VARCHAR(100) NOT NULL, "
+                    "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"))
+                applied = {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+                pending = [m for m in MIGRATIONS if m[0] not in applied]
+                if not pending:
+                    logger.info(f"Database schema is up to date ({time.time() - start_time:.3f}s)")
+                    return True
+
+                # New tables; existing ones are left alone
+                db.metadata.create_all(connection)
+
+                for version, name, migrate in pending:
+                    logger.info(f"Applying migration {version}: {name}")
+                    migrate(connection)
+                    connection.execute(
+                        text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                        {'version': version, 'name': name})
+
+            logger.info(f"Applied {len(pending)} migrations in {time.time() - start_time:.2f}s")
             return True
         except Exception as e:
             logger.error(f"Error during database migration: {str(e)}")
-            db.session.rollback()
             return False
 
 def set_user_as_admin(user_id):
@@ -0,0 +1,215 @@
+"""Canonical URLs and near-duplicate detection for new articles.
+
+The same story often reaches a user through several feeds, with tracking
+parameters or redirect wrappers around its URL. process_feeds looks for an
+earlier summarized article of the same user with the same canonical URL or
+nearly the same text, and copies that article's summary instead of asking
+Gemini again.
+
+Near-duplicates are found with 64-bit SimHash signatures over word
+shingles. Each signature is split into SIMHASH_BANDS bands stored in the
+article_simhash_band index. Signatures that differ in at most
+SIMHASH_MAX_DISTANCE bits share at least one band, so only articles with a
+matching band need a Hamming distance check.
+"""
+import hashlib
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from sqlalchemy import and_, or_, select
+
+from app import db
+from content_cleaner import html_to_paragraphs
+from models import Feed, Article, article_simhash_band
+
+logger = logging.getLogger(__name__)
+
+# Only articles this recent are considered as originals
+DEDUP_WINDOW_DAYS = int(os.environ.get('DEDUP_WINDOW_DAYS', 7))
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4  # must be larger than SIMHASH_MAX_DISTANCE
+SIMHASH_MAX_DISTANCE = int(os.environ.get('SIMHASH_MAX_DISTANCE', 3))
+# Texts with fewer shingles than this only match on their canonical URL
+SIMHASH_MIN_SHINGLES = 20
+SHINGLE_SIZE = 3
+
+_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+_TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid',
+    'mc_eid', '_hsenc', '_hsmi', 'mkt_tok', 'ref', 'ref_src', 'cmpid',
+    'ncid', 'ocid', 'sr_share', 'spm', 'guccounter',
+}
+_TRACKING_PREFIXES = ('utm_', 'ga_', 'pk_', 'mtm_', 'at_')
+
+# Redirect wrappers whose target URL is carried in a query parameter
+_REDIRECT_PARAMS = {
+    ('google.com', '/url'): ('url', 'q'),
+    ('l.facebook.com', '/l.php'): ('u', ),
+    ('lm.facebook.com', '/l.php'): ('u', ),
+    ('out.reddit.com', None): ('url', ),
+    ('youtube.com', '/redirect'): ('q', ),
+    ('news.url.google.com', '/url'): ('url', ),
+    ('t.umblr.com', '/redirect'): ('z', ),
+    ('href.li', None): None,  # the target follows the '?'
+}
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def _host(netloc):
+    host = netloc.lower().rsplit('@', 1)[-1]
+    if host.endswith(':80') or host.endswith(':443'):
+        host = host.rsplit(':', 1)[0]
+    return host[4:] if host.startswith('www.') else host
+
+
+def _unwrap_redirect(url, depth=0):
+    """Return the target of a known redirect wrapper, or the URL itself."""
+    parts = urlsplit(url)
+    host = _host(parts.netloc)
+    for (redirect_host, path), params in _REDIRECT_PARAMS.items():
+        if host != redirect_host or (path and parts.path != path):
+            continue
+        if params is None:
+            target = parts.query
+        else:
+            query = dict(parse_qsl(parts.query))
+            target = next((query[name] for name in params if query.get(name)), '')
+        if target.startswith(('http://', 'https://')) and depth < 3:
+            return _unwrap_redirect(target, depth + 1)
+    return url
+
+
+def canonicalize_url(url):
+    """Normalize an article URL so that variants of the same link compare equal.
+
+    Known redirect wrappers are unwrapped, tracking parameters, fragments,
+    default ports and 'www.' are dropped, the remaining query parameters are
+    sorted and the scheme is reduced to https.
+    """
+    if not url:
+        return url
+    url = _unwrap_redirect(url.strip())
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https'):
+        return url
+
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in _TRACKING_PARAMS
+        and not name.lower().startswith(_TRACKING_PREFIXES))
+    path = parts.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+    return urlunsplit(('https', _host(parts.netloc), path, urlencode(query), ''))
+
+
+def _shingles(text):
+    words = [word.lower() for word in _WORD_RE.findall(text)]
+    if len(words) < SHINGLE_SIZE:
+        return [' '.join(words)] if words else []
+    return [
+        ' '.join(words[i:i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    ]
+
+
+def simhash(title, content):
+    """SimHash of the article's title and text as a signed 64-bit integer.
+
+    Returns None when the text is too short for a meaningful signature.
+    """
+    text = ' '.join([title or ''] + html_to_paragraphs(content))
+    shingles = _shingles(text)
+    if len(shingles) < SIMHASH_MIN_SHINGLES:
+        return None
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(
+            hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    signature = sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+    # Stored in a signed BIGINT column
+    return signature - (1 << 64) if signature >= 1 << 63 else signature
+
+
+def simhash_bands(signature):
+    """Split a signature into (band, value) pairs for the band index."""
+    unsigned = signature & ((1 << 64) - 1)
+    return [(band, unsigned >> (band * _BAND_BITS) & _BAND_MASK)
+            for band in range(SIMHASH_BANDS)]
+
+
+def hamming_distance(a, b):
+    return bin((a ^ b) & ((1 << 64) - 1)).count('1')
+
+
+def find_original(user_id, canonical_url, signature):
+    """Find a summarized article of the user that the new article duplicates.
+
+    Returns:
+        tuple: (Article, 'url' or 'content') or (None, None).
+    """
+    since = datetime.utcnow() - timedelta(days=DEDUP_WINDOW_DAYS)
+    originals = Article.query.join(Feed, Article.feed_id == Feed.id).filter(
+        Feed.user_id == user_id,
+        Feed.deleted_at.is_(None),
+        Article.duplicate_of_id.is_(None),
+        Article.processed == True,
+        Article.created_at >= since)
+
+    if canonical_url:
+        original = originals.filter(
+            Article.canonical_url == canonical_url).order_by(Article.id).first()
+        if original:
+            return original, 'url'
+
+    if signature is None:
+        return None, None
+
+    band_filter = or_(*[
+        and_(article_simhash_band.c.band == band, article_simhash_band.c.value == value)
+        for band, value in simhash_bands(signature)
+    ])
+    candidates = originals.filter(
+        Article.id.in_(select(article_simhash_band.c.article_id).where(
+            band_filter))).all()
+
+    best = None
+    best_distance = SIMHASH_MAX_DISTANCE + 1
+    for candidate in candidates:
+        distance = hamming_distance(candidate.simhash, signature)
+        if distance < best_distance:
+            best, best_distance = candidate, distance
+    return (best, 'content') if best else (None, None)
+
+
+def index_signature(article_id, signature):
+    """Add an article's signature to the band index; the caller commits."""
+    if signature is None:
+        return
+    db.session.execute(article_simhash_band.insert(), [{
+        'band': band,
+        'value': value,
+        'article_id': article_id
+    } for band, value in simhash_bands(signature)])
+
+
+def copy_summary(article, original):
+    """Link a duplicate to its original and reuse the original's summary."""
+    article.duplicate_of_id = original.id
+    article.summary = original.summary
+    article.critique = original.critique
+    for tag in original.tags:
+        article.tags.append(tag)
+    for category in original.categories:
+        article.categories.append(category)
+    article.processed = True
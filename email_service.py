@@ -4,6 +4,7 @@ import logging
 from flask import render_template, current_app
 from app import db
 from models import User, Article, Feed
+from read_models import ARTICLE_DETAIL_COLUMNS, with_load_profile, article_views
 from datetime import datetime, timedelta
 
 # Configure Resend and logging
@@ -77,11 +78,14 @@ def send_daily_digest():
     
     for user in users:
         yesterday = datetime.utcnow() - timedelta(days=1)
-        articles = Article.query.join(Feed).filter(
-            Feed.user_id == user.id,
-            Article.created_at >= yesterday,
-            Article.processed == True
-        ).order_by(Article.published_date.desc().nullslast()).all()
+        articles = article_views(
+            with_load_profile(Article.query.join(Feed), ARTICLE_DETAIL_COLUMNS).filter(
+                Feed.user_id == user.id,
+                Feed.deleted_at.is_(None),
+                Article.created_at >= yesterday,
+                Article.processed == True,
+                Article.duplicate_of_id.is_(None)
+            ).order_by(Article.published_date.desc().nullslast()).all())
         
         if articles:
             try:
@@ -118,11 +122,14 @@ def send_weekly_digest():
     
     for user in users:
         last_week = datetime.utcnow() - timedelta(days=7)
-        articles = Article.query.join(Feed).filter(
-            Feed.user_id == user.id,
-            Article.created_at >= last_week,
-            Article.processed == True
-        ).order_by(Article.published_date.desc().nullslast()).all()
+        articles = article_views(
+            with_load_profile(Article.query.join(Feed), ARTICLE_DETAIL_COLUMNS).filter(
+                Feed.user_id == user.id,
+                Feed.deleted_at.is_(None),
+                Article.created_at >= last_week,
+                Article.processed == True,
+                Article.duplicate_of_id.is_(None)
+            ).order_by(Article.published_date.desc().nullslast()).all())
         
         if articles:
             try:
@@ -0,0 +1,257 @@
+"""Per-poll feed health history with hourly roll-ups and retention.
+
+Every poll appends a FeedPollResult row. The roll-up job aggregates those
+rows into FeedHealthHourly buckets, including the current partial hour, and
+purges raw rows after FEED_POLL_RETENTION_DAYS and buckets after
+FEED_HEALTH_RETENTION_DAYS. The health dashboard reads only the buckets.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func
+
+from app import db
+from models import FeedPollResult, FeedHealthHourly, JobCheckpoint
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'feed_health_rollup'
+FEED_POLL_RETENTION_DAYS = int(os.environ.get('FEED_POLL_RETENTION_DAYS', 7))
+FEED_HEALTH_RETENTION_DAYS = int(os.environ.get('FEED_HEALTH_RETENTION_DAYS', 90))
+
+# Upper bounds (seconds) of the poll duration histogram kept per bucket
+POLL_DURATION_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf'))
+
+# A trend is reported once the window differs from the one before by this much
+TREND_THRESHOLD = 0.2
+
+
+def _hour_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def record_poll(feed_id, duration, success, bytes_received=0, new_entries=0,
+                http_status=None, error=None):
+    """Add the outcome of one feed poll to the session; the caller commits."""
+    if error is not None and http_status is None:
+        # requests.HTTPError carries the response that failed
+        http_status = getattr(getattr(error, 'response', None), 'status_code', None)
+    db.session.add(FeedPollResult(
+        feed_id=feed_id,
+        polled_at=datetime.utcnow(),
+        duration=duration,
+        bytes_received=bytes_received,
+        new_entries=new_entries,
+        http_status=http_status,
+        error_class=type(error).__name__[:100] if error is not None else None,
+        success=success))
+
+
+def _rollup_hour(hour):
+    """Replace the buckets for `hour` with aggregates of its raw poll results."""
+    next_hour = hour + timedelta(hours=1)
+    bucket_columns = [
+        func.sum(case((FeedPollResult.duration <= bound, 1), else_=0))
+        for bound in POLL_DURATION_BUCKETS[:-1]
+    ]
+    rows = db.session.query(
+        FeedPollResult.feed_id,
+        func.count(FeedPollResult.id),
+        func.sum(case((FeedPollResult.success == False, 1), else_=0)),
+        func.sum(FeedPollResult.duration),
+        func.max(FeedPollResult.duration),
+        func.sum(FeedPollResult.bytes_received),
+        func.sum(FeedPollResult.new_entries),
+        *bucket_columns).filter(
+            FeedPollResult.polled_at >= hour,
+            FeedPollResult.polled_at < next_hour).group_by(
+                FeedPollResult.feed_id).all()
+
+    FeedHealthHourly.query.filter(FeedHealthHourly.hour == hour).delete(
+        synchronize_session=False)
+
+    for feed_id, polls, errors, total_duration, max_duration, total_bytes, \
+            new_entries, *cumulative in rows:
+        # The query returns cumulative counts; store the count per bucket
+        cumulative = [int(count or 0) for count in cumulative] + [polls]
+        histogram = [cumulative[0]] + [
+            cumulative[i] - cumulative[i - 1] for i in range(1, len(cumulative))
+        ]
+        db.session.add(FeedHealthHourly(
+            feed_id=feed_id,
+            hour=hour,
+            poll_count=polls,
+            error_count=int(errors or 0),
+            total_duration=float(total_duration or 0.0),
+            max_duration=float(max_duration or 0.0),
+            total_bytes=int(total_bytes or 0),
+            new_entries=int(new_entries or 0),
+            duration_histogram=histogram))
+    return len(rows)
+
+
+def rollup_feed_health(now=None):
+    """Aggregate new poll results into hourly buckets and apply retention.
+
+    Hours are recomputed from the last rolled-up hour onwards, so the partial
+    current hour is refreshed on every run and late rows are never lost.
+
+    Returns:
+        dict: The number of hours and buckets written and rows purged.
+    """
+    now = now or datetime.utcnow()
+    current_hour = _hour_start(now)
+    raw_cutoff = now - timedelta(days=FEED_POLL_RETENTION_DAYS)
+
+    try:
+        checkpoint = db.session.get(JobCheckpoint, CHECKPOINT_NAME)
+        if checkpoint and checkpoint.value:
+            start_hour = datetime.fromisoformat(checkpoint.value)
+        else:
+            checkpoint = JobCheckpoint(name=CHECKPOINT_NAME)
+            db.session.add(checkpoint)
+            oldest = db.session.query(func.min(FeedPollResult.polled_at)).scalar()
+            start_hour = _hour_start(oldest) if oldest else current_hour
+        # Raw rows older than the retention window no longer exist
+        start_hour = max(start_hour, _hour_start(raw_cutoff))
+
+        hours = 0
+        buckets = 0
+        hour = start_hour
+        while hour <= current_hour:
+            buckets += _rollup_hour(hour)
+            hours += 1
+            checkpoint.value = hour.isoformat()
+            db.session.commit()
+            hour += timedelta(hours=1)
+
+        raw_purged = FeedPollResult.query.filter(
+            FeedPollResult.polled_at < raw_cutoff).delete(
+                synchronize_session=False)
+        buckets_purged = FeedHealthHourly.query.filter(
+            FeedHealthHourly.hour < now - timedelta(
+                days=FEED_HEALTH_RETENTION_DAYS)).delete(
+                    synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Error in rollup_feed_health: {str(e)}")
+        db.session.rollback()
+        raise
+
+    logger.info(
+        f"Feed health rollup: {buckets} buckets over {hours} hours, purged "
+        f"{raw_purged} poll results and {buckets_purged} hourly buckets")
+    return {
+        'hours': hours,
+        'buckets': buckets,
+        'raw_purged': raw_purged,
+        'buckets_purged': buckets_purged,
+    }
+
+
+def histogram_percentile(histogram, pct):
+    """Estimate a percentile (0-100) as the upper bound of the bucket holding it.
+
+    Returns None for an empty histogram; the open-ended last bucket reports
+    the largest finite bound.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = pct / 100 * total
+    seen = 0
+    for bound, count in zip(POLL_DURATION_BUCKETS, histogram):
+        seen += count
+        if seen >= rank:
+            return bound if bound != float('inf') else POLL_DURATION_BUCKETS[-2]
+    return POLL_DURATION_BUCKETS[-2]
+
+
+def _trend(current, previous):
+    if current is None or previous is None:
+        return 'flat'
+    if previous == 0:
+        return 'up' if current > 0 else 'flat'
+    change = (current - previous) / previous
+    if change > TREND_THRESHOLD:
+        return 'up'
+    if change < -TREND_THRESHOLD:
+        return 'down'
+    return 'flat'
+
+
+def _empty_window():
+    return {
+        'polls': 0,
+        'errors': 0,
+        'total_duration': 0.0,
+        'max_duration': 0.0,
+        'bytes': 0,
+        'new_entries': 0,
+        'histogram': [0] * len(POLL_DURATION_BUCKETS),
+    }
+
+
+def _add_bucket(window, bucket):
+    window['polls'] += bucket.poll_count
+    window['errors'] += bucket.error_count
+    window['total_duration'] += bucket.total_duration
+    window['max_duration'] = max(window['max_duration'], bucket.max_duration)
+    window['bytes'] += bucket.total_bytes
+    window['new_entries'] += bucket.new_entries
+    for index, count in enumerate(bucket.duration_histogram or []):
+        window['histogram'][index] += count
+
+
+def _window_stats(window):
+    polls = window['polls']
+    return {
+        'polls': polls,
+        'errors': window['errors'],
+        'error_rate': window['errors'] / polls * 100 if polls else None,
+        'avg_duration': window['total_duration'] / polls if polls else None,
+        'p50_duration': histogram_percentile(window['histogram'], 50),
+        'p95_duration': histogram_percentile(window['histogram'], 95),
+        'max_duration': window['max_duration'] if polls else None,
+        'bytes': window['bytes'],
+        'new_entries': window['new_entries'],
+    }
+
+
+def feed_health_summary(feed_ids, hours=24, now=None):
+    """Summarize the hourly buckets of the given feeds.
+
+    The last `hours` hours are compared with the `hours` before them to
+    derive duration and error-rate trends ('up', 'down' or 'flat').
+
+    Returns:
+        tuple: (per-feed stats keyed by feed id, stats across all feeds)
+    """
+    now = now or datetime.utcnow()
+    window_start = _hour_start(now) - timedelta(hours=hours - 1)
+    previous_start = window_start - timedelta(hours=hours)
+
+    current = {feed_id: _empty_window() for feed_id in feed_ids}
+    previous = {feed_id: _empty_window() for feed_id in feed_ids}
+    overall = _empty_window()
+
+    if feed_ids:
+        buckets = FeedHealthHourly.query.filter(
+            FeedHealthHourly.feed_id.in_(feed_ids),
+            FeedHealthHourly.hour >= previous_start).all()
+        for bucket in buckets:
+            if bucket.hour >= window_start:
+                _add_bucket(current[bucket.feed_id], bucket)
+                _add_bucket(overall, bucket)
+            else:
+                _add_bucket(previous[bucket.feed_id], bucket)
+
+    per_feed = {}
+    for feed_id in feed_ids:
+        stats = _window_stats(current[feed_id])
+        before = _window_stats(previous[feed_id])
+        stats['duration_trend'] = _trend(stats['avg_duration'], before['avg_duration'])
+        stats['error_trend'] = _trend(stats['error_rate'], before['error_rate'])
+        per_feed[feed_id] = stats
+    return per_feed, _window_stats(overall)
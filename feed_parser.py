@@ -0,0 +1,404 @@
+"""Fetching and parsing of raw feed documents.
+
+This module intentionally does not import the Flask app or the models so
+that the parse functions can run inside worker processes.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, NamedTuple, Optional
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+import feedparser
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Parse mode used by process_feeds: 'inline' parses in the calling thread,
+# 'process' hands the raw bytes to a process pool so parsing does not hold the GIL,
+# 'stream' parses incrementally while downloading and stops after the needed entries
+FEED_PARSE_MODE = os.environ.get('FEED_PARSE_MODE', 'inline')
+FEED_PARSE_WORKERS = int(
+    os.environ.get('FEED_PARSE_WORKERS', min(os.cpu_count() or 2, 4)))
+FEED_FETCH_TIMEOUT = 30  # seconds
+FEED_MAX_BYTES = int(os.environ.get('FEED_MAX_BYTES', 5 * 1024 * 1024))
+FEED_CHUNK_SIZE = 64 * 1024
+MAX_ENTRIES_PER_FEED = 10
+# Raw responses are reused for this long, so a feed fetched again right after
+# its first fetch (retries, other subscribers, imports) is downloaded once
+FEED_RESPONSE_CACHE_SECONDS = int(os.environ.get('FEED_RESPONSE_CACHE_SECONDS', 300))
+FEED_RESPONSE_CACHE_BYTES = int(
+    os.environ.get('FEED_RESPONSE_CACHE_BYTES', 16 * 1024 * 1024))
+
+# Local element names (namespaces stripped) used by the streaming parser
+_ENTRY_TAGS = {'item', 'entry'}
+_CONTAINER_TAGS = {'channel', 'feed'}
+_DATE_TAGS = ('published', 'pubDate', 'issued', 'date')
+_DESCRIPTION_TAGS = ('description', 'summary', 'encoded', 'content')
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+# url -> (monotonic fetch time, content, status), least recently used first
+_response_cache = OrderedDict()
+_response_cache_bytes = 0
+_response_cache_lock = threading.Lock()
+
+
+class ParsedEntry(NamedTuple):
+    """Compact, picklable record of a single feed entry."""
+    title: str
+    link: str
+    description: str
+    published: Optional[datetime]
+    guid: Optional[str]
+
+
+class ParsedFeed(NamedTuple):
+    title: Optional[str]
+    entries: List[ParsedEntry]
+    # Filled in by load_feed/stream_feed for the feed health history
+    bytes_received: int = 0
+    http_status: Optional[int] = None
+    # Set when the download hit FEED_MAX_BYTES and only the entries read
+    # before the limit are returned
+    truncated: bool = False
+
+
+class FeedTooLargeError(Exception):
+    """Raised when a feed response exceeds FEED_MAX_BYTES."""
+
+
+def _open_feed(url, max_bytes):
+    """Start a streaming download, rejecting declared oversized responses."""
+    response = requests.get(url,
+                            timeout=FEED_FETCH_TIMEOUT,
+                            headers={'User-Agent': 'tldr.express'},
+                            stream=True)
+    response.raise_for_status()
+
+    declared_length = response.headers.get('Content-Length')
+    if declared_length and declared_length.isdigit() and int(
+            declared_length) > max_bytes:
+        response.close()
+        raise FeedTooLargeError(
+            f"Feed {url} declares {declared_length} bytes (limit {max_bytes})")
+    return response
+
+
+def _iter_capped(response, url, max_bytes):
+    """Yield response chunks, aborting once more than max_bytes were read."""
+    received = 0
+    for chunk in response.iter_content(chunk_size=FEED_CHUNK_SIZE):
+        received += len(chunk)
+        if received > max_bytes:
+            raise FeedTooLargeError(
+                f"Feed {url} exceeded the {max_bytes} byte limit")
+        yield chunk
+
+
+def _download(url, max_bytes):
+    """Return the raw feed document and the HTTP status it was served with."""
+    response = _open_feed(url, max_bytes)
+    with response:
+        return b''.join(_iter_capped(response, url, max_bytes)), response.status_code
+
+
+def _cached_response(url):
+    """Return (content, status) fetched for `url` within the cache TTL, or None."""
+    global _response_cache_bytes
+    with _response_cache_lock:
+        cached = _response_cache.get(url)
+        if cached is None:
+            return None
+        fetched_at, content, status = cached
+        if time.monotonic() - fetched_at > FEED_RESPONSE_CACHE_SECONDS:
+            del _response_cache[url]
+            _response_cache_bytes -= len(content)
+            return None
+        _response_cache.move_to_end(url)
+        return content, status
+
+
+def _cache_response(url, content, status):
+    global _response_cache_bytes
+    if FEED_RESPONSE_CACHE_SECONDS <= 0 or len(content) > FEED_RESPONSE_CACHE_BYTES:
+        return
+    with _response_cache_lock:
+        previous = _response_cache.pop(url, None)
+        if previous is not None:
+            _response_cache_bytes -= len(previous[1])
+        _response_cache[url] = (time.monotonic(), content, status)
+        _response_cache_bytes += len(content)
+        while _response_cache_bytes > FEED_RESPONSE_CACHE_BYTES:
+            _, (_, evicted, _) = _response_cache.popitem(last=False)
+            _response_cache_bytes -= len(evicted)
+
+
+def clear_response_cache():
+    global _response_cache_bytes
+    with _response_cache_lock:
+        _response_cache.clear()
+        _response_cache_bytes = 0
+
+
+def fetch_feed_content(url, max_bytes=FEED_MAX_BYTES):
+    """Download the raw feed document and return its bytes.
+
+    The download is aborted with FeedTooLargeError as soon as more than
+    `max_bytes` have been received.
+    """
+    return _download(url, max_bytes)[0]
+
+
+def parse_feed_content(content, max_entries=MAX_ENTRIES_PER_FEED):
+    """Parse raw feed bytes into a ParsedFeed.
+
+    Only the first `max_entries` entries are converted, and only the fields
+    process_feeds needs are kept, so the result is cheap to pickle.
+    """
+    parsed = feedparser.parse(content)
+
+    entries = []
+    for entry in parsed.entries[:max_entries]:
+        link = entry.get('link')
+        if not link:
+            continue
+
+        published = entry.get('published_parsed', None)
+        if published:
+            published = datetime(*published[:6])
+
+        entries.append(
+            ParsedEntry(title=entry.get('title', ''),
+                        link=link,
+                        description=entry.get('description', ''),
+                        published=published,
+                        guid=entry.get('id')))
+
+    return ParsedFeed(title=parsed.feed.get('title'), entries=entries)
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def _parse_date(value):
+    """Parse an RFC 822 or ISO 8601 date into a naive UTC datetime."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _entry_from_element(element):
+    """Build a ParsedEntry from an RSS <item> or Atom <entry> element."""
+    fields = {}
+    link = None
+    for child in element:
+        name = _local_name(child.tag)
+        text = (child.text or '').strip()
+        if name == 'link':
+            # RSS links carry the URL as text, Atom links in the href attribute
+            href = child.get('href')
+            rel = child.get('rel', 'alternate')
+            if text and not link:
+                link = text
+            elif href and rel == 'alternate' and not link:
+                link = href
+        elif text and name not in fields:
+            fields[name] = text
+
+    description = next(
+        (fields[name] for name in _DESCRIPTION_TAGS if name in fields), '')
+    published = next(
+        (fields[name] for name in _DATE_TAGS if name in fields), None)
+
+    return ParsedEntry(title=fields.get('title', ''),
+                       link=link,
+                       description=description,
+                       published=_parse_date(published),
+                       guid=fields.get('guid') or fields.get('id'))
+
+
+def stream_feed(url, max_entries=MAX_ENTRIES_PER_FEED, max_bytes=FEED_MAX_BYTES):
+    """Incrementally parse an RSS or Atom feed while it downloads.
+
+    Entry elements are discarded as soon as they have been converted, and the
+    download stops once `max_entries` entries have been read. The raw bytes
+    read so far are kept (at most `max_bytes`) so that documents the strict
+    XML parser rejects can be handed to feedparser without a second download.
+
+    If the document exceeds `max_bytes` after some entries were read, those
+    entries are returned with `truncated` set; otherwise FeedTooLargeError
+    is raised.
+    """
+    parser = XMLPullParser(events=('start', 'end'))
+    stack = []
+    title = None
+    entries = []
+    chunks = []
+    received = 0
+
+    response = _open_feed(url, max_bytes)
+    status = response.status_code
+    with response:
+        chunk_iter = _iter_capped(response, url, max_bytes)
+        try:
+            for chunk in chunk_iter:
+                chunks.append(chunk)
+                received += len(chunk)
+                parser.feed(chunk)
+                for event, element in parser.read_events():
+                    if event == 'start':
+                        stack.append(element)
+                        continue
+
+                    stack.pop()
+                    name = _local_name(element.tag)
+                    parent_name = _local_name(stack[-1].tag) if stack else ''
+
+                    if name == 'title' and parent_name in _CONTAINER_TAGS and title is None:
+                        title = (element.text or '').strip() or None
+                    elif name in _ENTRY_TAGS:
+                        entry = _entry_from_element(element)
+                        if entry.link:
+                            entries.append(entry)
+                        # Drop the converted entry so the tree never grows
+                        if stack:
+                            stack[-1].remove(element)
+                        if len(entries) >= max_entries:
+                            return ParsedFeed(title, entries, received, status)
+            parser.close()
+        except FeedTooLargeError:
+            if not entries:
+                raise
+            logger.warning(
+                f"Feed {url} exceeded the {max_bytes} byte limit, keeping the first {len(entries)} entries")
+            return ParsedFeed(title, entries, received, status, truncated=True)
+        except ParseError as e:
+            logger.warning(
+                f"Streaming parse of {url} failed ({str(e)}), falling back to feedparser")
+            # Read the rest of the document into the kept bytes
+            truncated = False
+            try:
+                for chunk in chunk_iter:
+                    chunks.append(chunk)
+                    received += len(chunk)
+            except FeedTooLargeError:
+                truncated = True
+            parsed = parse_feed_content(b''.join(chunks), max_entries)
+            if truncated and not parsed.entries:
+                raise FeedTooLargeError(
+                    f"Feed {url} exceeded the {max_bytes} byte limit")
+            return parsed._replace(bytes_received=received, http_status=status,
+                                   truncated=truncated)
+
+    return ParsedFeed(title, entries, received, status)
+
+
+def get_parse_pool():
+    """Return the shared parse process pool, creating it on first use."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # Forking a process that runs scheduler and request threads can
+            # copy a lock held by another thread into the child, which then
+            # deadlocks. Workers are started from a clean server process (or
+            # spawned) instead and import this module to run parse_feed_content.
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context('spawn')
+            _parse_pool = ProcessPoolExecutor(max_workers=FEED_PARSE_WORKERS,
+                                              mp_context=context)
+            atexit.register(shutdown_parse_pool)
+            logger.info(
+                f"Started feed parse pool with {FEED_PARSE_WORKERS} workers")
+        return _parse_pool
+
+
+def shutdown_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=False, cancel_futures=True)
+            _parse_pool = None
+
+
+def load_feed(url,
+              parse_mode=None,
+              max_entries=MAX_ENTRIES_PER_FEED,
+              timings=None,
+              use_cache=True):
+    """Fetch a feed and parse it using the requested parse mode.
+
+    Args:
+        url: The URL of the feed to load.
+        parse_mode: 'inline', 'process' or 'stream'. Defaults to FEED_PARSE_MODE.
+        max_entries: Maximum number of entries to return.
+        timings: Optional dict that receives the 'fetch' and 'parse' durations
+            in seconds. Stream mode parses while downloading, so all of its
+            time is reported as 'fetch'.
+        use_cache: Reuse a response downloaded within
+            FEED_RESPONSE_CACHE_SECONDS instead of fetching the feed again.
+
+    Returns:
+        ParsedFeed: The feed title, its first `max_entries` entries, the
+            number of bytes downloaded (0 for cached responses) and the
+            HTTP status.
+
+    Raises:
+        FeedTooLargeError: If the response is larger than FEED_MAX_BYTES.
+    """
+    parse_mode = parse_mode or FEED_PARSE_MODE
+    timings = timings if timings is not None else {}
+
+    start = time.perf_counter()
+    cached = _cached_response(url) if use_cache else None
+    if cached is not None:
+        content, status = cached
+        received = 0
+    elif parse_mode == 'stream':
+        # Stream mode stops reading early, so there is no full body to cache
+        parsed = stream_feed(url, max_entries)
+        timings['fetch'] = time.perf_counter() - start
+        timings['parse'] = 0.0
+        return parsed
+    else:
+        content, status = _download(url, FEED_MAX_BYTES)
+        received = len(content)
+        _cache_response(url, content, status)
+    fetched = time.perf_counter()
+    timings['fetch'] = fetched - start
+
+    if parse_mode == 'process':
+        future = get_parse_pool().submit(parse_feed_content, content,
+                                         max_entries)
+        parsed = future.result()
+    else:
+        # Cached responses of stream-mode feeds are parsed inline
+        if parse_mode not in ('inline', 'stream'):
+            logger.warning(
+                f"Unknown feed parse mode '{parse_mode}', parsing inline")
+        parsed = parse_feed_content(content, max_entries)
+
+    timings['parse'] = time.perf_counter() - fetched
+    return parsed._replace(bytes_received=received, http_status=status)
@@ -1,15 +1,21 @@
-import os
-import feedparser
 import logging
 from datetime import datetime, timedelta
 from urllib.parse import urlparse
 from sqlalchemy import or_
 from app import scheduler, db
-from models import User, Feed, Article, Tag, Category
-from ai_summarizer import generate_summary, get_or_create_tag, get_or_create_category
+from models import User, Feed, Article
+from ai_summarizer import generate_summary, apply_summary
 from email_service import send_daily_digest, send_weekly_digest
-
-logger = logging.getLogger(__name__)
+from feed_parser import load_feed
+from feed_health import record_poll
+from feed_import import INITIAL_FETCH_INTERVAL, pending_import_feed_ids
+from dedup import canonicalize_url, simhash, find_original, index_signature, copy_summary
+from topic_counts import add_article_topics
+from purge import FEED_PURGE_INTERVAL, delete_expired_accounts, purge_deleted_feeds
+from webhook_reconciler import WEBHOOK_RECONCILE_INTERVAL, reconcile_webhooks
+from metrics import (FEED_STAGE_SECONDS, FEED_PROCESSING_SECONDS,
+                     FEEDS_PROCESSED, ARTICLES_CREATED, ARTICLES_DEDUPLICATED)
+from query_profiler import profile_queries
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,110 +24,50 @@ logger = logging.getLogger(__name__)
 
 def cleanup_expired_accounts():
     """Delete unverified accounts with expired verification tokens."""
-    from app import db
-    from models import User, Feed, Article
-    from datetime import datetime
-    import logging
-
-    logger = logging.getLogger(__name__)
-
     try:
-        # Find unverified accounts with expired tokens
-        expired_accounts = User.query.filter(
-            User.email_verified == False,
-            User.verification_token.is_not(None),
-            User.verification_token_expires <= datetime.utcnow()).all()
-
-        if not expired_accounts:
+        deleted_count = delete_expired_accounts()
+        if deleted_count:
+            logger.info(
+                f"Cleanup completed: Deleted {deleted_count} expired unverified accounts")
+        else:
             logger.info("No expired unverified accounts found")
-            return
-
-        logger.info(
-            f"Found {len(expired_accounts)} expired unverified accounts to be cleaned up"
-        )
-        logger.info("Starting cleanup process...")
-        deleted_count = 0
-
-        for user in expired_accounts:
-            try:
-                logger.info(
-                    f"Processing expired account - User ID: {user.id}, Email: {user.email}"
-                )
-
-                # Count associated data for logging
-                feeds = Feed.query.filter_by(user_id=user.id).all()
-                feed_count = len(feeds)
-                article_count = 0
-
-                # Delete all associated articles first
-                for feed in feeds:
-                    count = Article.query.filter_by(
-                        feed_id=feed.id).delete()
-                    article_count += count
-                    logger.info(
-                        f"Deleted {count} articles for feed ID: {feed.id}")
-
-                # Then delete all feeds
-                Feed.query.filter_by(user_id=user.id).delete()
-                logger.info(
-                    f"Deleted {feed_count} feeds for user ID: {user.id}")
-
-                # Finally delete the user
-                db.session.delete(user)
-                deleted_count += 1
-
-                # Commit after each successful user deletion
-                db.session.commit()
-                logger.info(
-                    f"Successfully deleted expired unverified user ID: {user.id} with {feed_count} feeds and {article_count} articles"
-                )
-
-            except Exception as e:
-                logger.error(
-                    f"Error deleting expired account {user.id}: {str(e)}")
-                db.session.rollback()
-                continue
-
-        logger.info(
-            f"Cleanup completed: Deleted {deleted_count} expired unverified accounts"
-        )
-        logger.info(f"Cleanup completed at: {datetime.utcnow()}")
-
     except Exception as e:
         logger.error(f"Error in cleanup_expired_accounts: {str(e)}")
         db.session.rollback()
         raise
 
 
-def process_feeds(feeds=None, max_retries=3, webhook_triggered=False):
+def process_feeds(feeds=None,
+                  max_retries=3,
+                  webhook_triggered=False,
+                  parse_mode=None):
     """Process RSS feeds and generate summaries for new articles with retry mechanism.
     
     Args:
         feeds: Optional list of Feed objects to process. If None, all eligible feeds are processed.
         max_retries: Maximum number of retry attempts for failed feeds.
         webhook_triggered: Whether this processing was triggered by a webhook.
+        parse_mode: 'inline', 'process' (parse in a worker process pool) or
+            'stream' (bounded-memory incremental parsing). Defaults to the
+            FEED_PARSE_MODE environment setting.
     """
     from app import app, db
     import time
-    from webhook_service import register_webhook, generate_callback_url
 
-    with app.app_context():
+    with app.app_context(), profile_queries('process_feeds'):
         try:
             start_time = time.time()
             logger.info(
                 f"Starting feed processing cycle (webhook triggered: {webhook_triggered})"
             )
 
-            # Application URL for webhook callbacks
-            app_url = os.environ.get('APPLICATION_URL', 'https://tldr.express')
-            callback_url = generate_callback_url(app_url)
-
             if feeds is None:
                 # Get feeds that haven't been checked in the last hour
                 one_hour_ago = datetime.utcnow() - timedelta(hours=1)
                 
                 # Only get feeds for verified and unexpired accounts
                 query = Feed.query.join(User).filter(
+                    Feed.deleted_at.is_(None),  # Not waiting to be purged
                     User.email_verified == True,  # Only verified users
                     or_(
                         User.verification_token.is_(
@@ -141,6 +87,14 @@ def process_feeds(feeds=None, max_retries=3, webhook_triggered=False):
                         )
                     ).order_by(Feed.last_checked.asc().nullsfirst())
 
+                # New feeds of running OPML imports wait for the throttled
+                # initial-fetch job
+                pending_import_ids = pending_import_feed_ids()
+                if pending_import_ids:
+                    query = query.filter(
+                        or_(Feed.id.not_in(pending_import_ids),
+                            Feed.processing_attempts > 0))
+
                 try:
                     feeds = query.all()
                     feed_ids = [feed.id for feed in feeds]
@@ -169,11 +123,15 @@ def process_feeds(feeds=None, max_retries=3, webhook_triggered=False):
                         feed_ids.append(feed.id)
 
             for feed_id in feed_ids:
+                process_start = time.time()
                 try:
                     feed = Feed.query.get(feed_id)
                     if not feed:
                         logger.warning(f"Feed {feed_id} not found, skipping")
                         continue
+                    if feed.deleted_at:
+                        logger.info(f"Feed {feed_id} was deleted, skipping")
+                        continue
 
                     # Log processing attempt details
                     logger.info(f"Processing feed ID {feed_id}: {feed.url}")
@@ -185,156 +143,114 @@ def process_feeds(feeds=None, max_retries=3, webhook_triggered=False):
                     feed.processing_attempts += 1
                     db.session.commit()
 
-                    process_start = time.time()
-                    parsed_feed = feedparser.parse(feed.url)
-                    parse_time = time.time() - process_start
-                    logger.info(f"Feed parsing completed in {parse_time:.2f}s")
-
-                    if hasattr(parsed_feed.feed, 'title'):
-                        feed.title = parsed_feed.feed.title[:
-                                                            200]  # Truncate feed title
-                    else:
-                        feed.title = urlparse(
-                            feed.url).netloc[:200]  # Truncate netloc
-
-                    feed.last_checked = datetime.utcnow()
+                    timings = {}
+                    # A webhook means the feed changed, so skip the response cache
+                    parsed_feed = load_feed(feed.url,
+                                            parse_mode=parse_mode,
+                                            timings=timings,
+                                            use_cache=not webhook_triggered)
+                    FEED_STAGE_SECONDS.observe(timings['fetch'], stage='fetch')
+                    FEED_STAGE_SECONDS.observe(timings['parse'], stage='parse')
+                    logger.info(
+                        f"Feed fetched in {timings['fetch']:.2f}s and parsed in {timings['parse']:.2f}s"
+                    )
 
                     # Get the user object for customized summary generation
                     user = User.query.get(feed.user_id)
                     if not user:
                         continue
 
-                    # Register webhook only if not already registered and not webhook triggered
-                    if not webhook_triggered and callback_url:
-                        try:
-                            if feed.webhook_id:
-                                logger.info(
-                                    f"Webhook already registered for feed {feed.url} with ID: {feed.webhook_id}"
-                                )
-                            else:
-                                # First, explicitly rollback any pending transactions to avoid cascading errors
-                                db.session.rollback()
-                                
-                                # Check if this webhook ID already exists for another feed with the same URL
-                                existing_feed = Feed.query.filter(
-                                    Feed.webhook_id.isnot(None),
-                                    Feed.id != feed.id,
-                                    Feed.url == feed.url
-                                ).first()
-                                
-                                if existing_feed:
-                                    try:
-                                        # Reuse the existing webhook ID for the same feed URL
-                                        logger.info(f"Reusing existing webhook ID {existing_feed.webhook_id} for feed URL {feed.url}")
-                                        feed.webhook_id = existing_feed.webhook_id
-                                        db.session.commit()
-                                    except Exception as commit_error:
-                                        logger.error(f"Failed to set webhook ID (reuse): {str(commit_error)}")
-                                        db.session.rollback()
-                                        # Skip webhook registration for this feed to avoid further errors
-                                        continue
-                                else:
-                                    try:
-                                        # Register a new webhook - first check if any other feed with same URL has webhook
-                                        existing_webhook = db.session.query(Feed.webhook_id).filter(
-                                            Feed.webhook_id.isnot(None),
-                                            Feed.url == feed.url
-                                        ).first()
-                                        
-                                        if existing_webhook:
-                                            # Another check to see if since our earlier check, a webhook was registered
-                                            feed.webhook_id = existing_webhook[0]
-                                            db.session.commit()
-                                            logger.info(f"Using existing webhook ID {feed.webhook_id} for feed URL {feed.url}")
-                                        else:
-                                            # Register a new webhook
-                                            webhook_response = register_webhook(feed.url, callback_url)
-                                            if webhook_response and 'subscriptionId' in webhook_response:
-                                                feed.webhook_id = webhook_response['subscriptionId']
-                                                try:
-                                                    db.session.commit()
-                                                    logger.info(
-                                                        f"Registered webhook for feed {feed.url} with ID: {feed.webhook_id}"
-                                                    )
-                                                except Exception as commit_error:
-                                                    logger.error(f"Failed to save webhook ID: {str(commit_error)}")
-                                                    db.session.rollback()
-                                                    # Don't set webhook_id to avoid future duplicate key errors
-                                                    feed.webhook_id = None
-                                    except Exception as webhook_error:
-                                        logger.error(f"Error during webhook handling: {str(webhook_error)}")
-                                        db.session.rollback()
-                        except Exception as e:
-                            logger.error(
-                                f"Failed to register webhook for feed {feed.url}: {str(e)}"
-                            )
-                            # Continue processing even if webhook registration fails
+                    # Replaces the placeholder title of new feeds
+                    if parsed_feed.title:
+                        feed.title = parsed_feed.title[:200]  # Truncate feed title
+                    else:
+                        feed.title = urlparse(
+                            feed.url).netloc[:200]  # Truncate netloc
 
-                    # Process entries (limited to 10)
-                    entries = parsed_feed.entries[:10]
+                    feed.last_checked = datetime.utcnow()
+                    # Saved now so rolling back a failed entry does not undo it
+                    db.session.commit()
+
+                    # Entries are already limited to the first 10 by the parser
+                    entries = parsed_feed.entries
                     processed_count = 0
+                    new_count = 0
 
                     for entry in entries:
                         try:
-                            existing = Article.query.filter_by(
-                                url=entry.link, feed_id=feed.id).first()
+                            with FEED_STAGE_SECONDS.time(stage='dedup'):
+                                existing = Article.query.filter_by(
+                                    url=entry.link, feed_id=feed.id).first()
 
                             if not existing:
-                                published = entry.get('published_parsed', None)
-                                if published:
-                                    published = datetime(*published[:6])
+                                with FEED_STAGE_SECONDS.time(stage='canonicalize'):
+                                    canonical_url = canonicalize_url(entry.link)
+                                    if canonical_url and len(canonical_url) > 500:
+                                        canonical_url = None
+                                    signature = simhash(entry.title, entry.description)
+                                    original, match = find_original(
+                                        user.id, canonical_url, signature)
 
                                 article = Article(
                                     title=entry.title[:200] if entry.title else
                                     '',  # Truncate to 200 chars
                                     url=entry.link,
-                                    content=entry.get('description', ''),
-                                    published_date=published,
+                                    content=entry.description,
+                                    published_date=entry.published,
+                                    summary_attempts=1,
+                                    canonical_url=canonical_url,
+                                    simhash=signature,
                                     feed_id=feed.id)
 
-                                summary_result = generate_summary(
-                                    entry.title, entry.get('description', ''),
-                                    user)
-
-                                if summary_result:
-                                    article.summary = summary_result['summary']
-                                    article.critique = summary_result.get(
-                                        'critique')
-
-                                    # Process tags
-                                    if 'tags' in summary_result:
-                                        for tag_name in summary_result['tags']:
-                                            tag = get_or_create_tag(tag_name)
-                                            article.tags.append(tag)
-
-                                    # Process categories
-                                    if 'categories' in summary_result:
-                                        for category_name in summary_result[
-                                                'categories']:
-                                            category = get_or_create_category(
-                                                category_name)
-                                            article.categories.append(category)
-
-                                    article.processed = True
-                                    processed_count += 1
-
-                                db.session.add(article)
-                                db.session.commit()
+                                summary_result = None
+                                if original:
+                                    # Same story from another feed: no new LLM call
+                                    logger.info(
+                                        f"Entry {entry.link} duplicates article {original.id} (by {match}), reusing its summary")
+                                    ARTICLES_DEDUPLICATED.inc(match=match)
+                                else:
+                                    with FEED_STAGE_SECONDS.time(stage='summarize'):
+                                        summary_result = generate_summary(
+                                            entry.title, entry.description, user)
+
+                                with FEED_STAGE_SECONDS.time(stage='db_write'):
+                                    db.session.add(article)
+                                    if original:
+                                        copy_summary(article, original)
+                                        processed_count += 1
+                                    else:
+                                        # Articles left unprocessed are retried by the backfill job
+                                        if summary_result:
+                                            tags, categories = apply_summary(article, summary_result)
+                                            processed_count += 1
+                                        db.session.flush()
+                                        index_signature(article.id, signature)
+                                        if summary_result:
+                                            add_article_topics(
+                                                user.id, [tag.id for tag in tags],
+                                                [category.id for category in categories])
+                                    db.session.commit()
+                                new_count += 1
+                                ARTICLES_CREATED.inc(
+                                    summarized=str(bool(article.processed)).lower())
                                 logger.info(
                                     f"Added new article: {article.title}")
 
                         except Exception as e:
                             logger.error(f"Error processing entry: {str(e)}")
+                            db.session.rollback()
                             continue
 
                     # Update feed status and metrics
                     feed = Feed.query.get(feed_id)
                     if feed:
-                        end_time = time.time()
-                        processing_duration = end_time - start_time
+                        processing_duration = time.time() - process_start
 
                         feed.status = 'active'
-                        feed.error_message = None
+                        # Entries past the size limit were not read
+                        feed.error_message = (
+                            'Feed exceeds the size limit; only its first entries were read'
+                            if parsed_feed.truncated else None)
                         feed.success_count += 1
                         feed.last_successful_process = datetime.utcnow()
 
@@ -342,13 +258,12 @@ def process_feeds(feeds=None, max_retries=3, webhook_triggered=False):
                         feed.total_articles_processed += processed_count
                         feed.last_processing_duration = processing_duration
 
-                        # Calculate average processing time
-                        if feed.average_processing_time == 0:
-                            feed.average_processing_time = processing_duration
-                        else:
-                            feed.average_processing_time = (
-                                feed.average_processing_time +
-                                processing_duration) / 2
+                        # Running mean over all successful runs
+                        feed.average_processing_time = (
+                            feed.average_processing_time or 0) + (
+                                processing_duration -
+                                (feed.average_processing_time or 0)
+                            ) / feed.success_count
 
                         # Calculate health score (0-100) based on success rate
                         total_attempts = feed.success_count + feed.failure_count
@@ -356,18 +271,30 @@ def process_feeds(feeds=None, max_retries=3, webhook_triggered=False):
                             feed.health_score = (feed.success_count /
                                                  total_attempts) * 100
 
+                        if new_count:
+                            User.bump_content_version([feed.user_id])
+                        record_poll(feed.id,
+                                    processing_duration,
+                                    success=True,
+                                    bytes_received=parsed_feed.bytes_received,
+                                    new_entries=new_count,
+                                    http_status=parsed_feed.http_status)
                         db.session.commit()
+                        FEED_PROCESSING_SECONDS.observe(processing_duration,
+                                                        outcome='success')
+                        FEEDS_PROCESSED.inc(outcome='success')
                         logger.info(
                             f"Feed {feed.url} marked as active (processed {processed_count} articles in {processing_duration:.2f}s)"
                         )
 
                 except Exception as e:
                     logger.error(f"Error processing feed {feed_id}: {str(e)}")
+                    processing_duration = time.time() - process_start
+                    FEED_PROCESSING_SECONDS.observe(processing_duration,
+                                                    outcome='error')
+                    FEEDS_PROCESSED.inc(outcome='error')
                     feed = Feed.query.get(feed_id)
                     if feed:
-                        end_time = time.time()
-                        processing_duration = end_time - start_time
-
                         feed.status = 'error'
                         feed.error_message = str(e)
                         feed.failure_count += 1
@@ -404,10 +331,15 @@ def process_feeds(feeds=None, max_retries=3, webhook_triggered=False):
                                 f"Scheduled retry for feed {feed_id} at {next_retry}"
                             )
 
+                        record_poll(feed.id,
+                                    processing_duration,
+                                    success=False,
+                                    error=e)
                         db.session.commit()
                     continue
 
-            logger.info("Feed processing complete.")
+            logger.info(
+                f"Feed processing complete in {time.time() - start_time:.2f}s.")
 
         except Exception as e:
             logger.error(f"Error in process_feeds: {str(e)}")
@@ -461,6 +393,30 @@ def schedule_feed_processing(feed_id):
     logger.info(f"Scheduled processing for feed ID: {feed_id}")
 
 
+def schedule_initial_fetch():
+    """Run the initial-fetch job now instead of at its next interval."""
+    job = scheduler.get_job('initial_fetch')
+    if job:
+        job.modify(next_run_time=datetime.now())
+        logger.info("Initial fetch of imported feeds moved up")
+
+
+def schedule_feed_purge():
+    """Run the deleted-feed purge job now instead of at its next interval."""
+    job = scheduler.get_job('purge_deleted_feeds')
+    if job:
+        job.modify(next_run_time=datetime.now())
+        logger.info("Purge of deleted feeds moved up")
+
+
+def schedule_webhook_reconcile():
+    """Run the webhook reconciliation job now instead of at its next interval."""
+    job = scheduler.get_job('reconcile_webhooks')
+    if job:
+        job.modify(next_run_time=datetime.now())
+        logger.info("Webhook reconciliation moved up")
+
+
 def schedule_tasks():
     """Schedule periodic tasks for feed processing and email digests."""
     from app import app, scheduler
@@ -525,6 +481,72 @@ def schedule_tasks():
                 'coalesce': True,
                 'description': 'Weekly digest email task'
             },
+            {
+                'id': 'backfill_unprocessed_articles',
+                'func': backfill_unprocessed_articles_with_context,
+                'trigger': 'interval',
+                'minutes': 30,
+                'next_run_time': datetime.now() + timedelta(minutes=10),
+                'misfire_grace_time': 1800,
+                'max_instances': 1,
+                'coalesce': True,
+                'description': 'Unprocessed article backfill task'
+            },
+            {
+                'id': 'rollup_feed_health',
+                'func': rollup_feed_health_with_context,
+                'trigger': 'interval',
+                'minutes': 15,
+                'next_run_time': datetime.now() + timedelta(minutes=2),
+                'misfire_grace_time': 900,
+                'max_instances': 1,
+                'coalesce': True,
+                'description': 'Feed health rollup and retention task'
+            },
+            {
+                'id': 'apply_article_retention',
+                'func': apply_article_retention_with_context,
+                'trigger': 'cron',
+                'hour': 3,  # off-peak, well clear of the digest jobs
+                'minute': 30,
+                'misfire_grace_time': 3600,
+                'max_instances': 1,
+                'coalesce': True,
+                'description': 'Article retention and pruning task'
+            },
+            {
+                'id': 'initial_fetch',
+                'func': initial_fetch_with_context,
+                'trigger': 'interval',
+                'seconds': INITIAL_FETCH_INTERVAL,
+                'next_run_time': datetime.now() + timedelta(seconds=45),
+                'misfire_grace_time': 300,
+                'max_instances': 1,
+                'coalesce': True,
+                'description': 'Throttled initial fetch of imported feeds'
+            },
+            {
+                'id': 'purge_deleted_feeds',
+                'func': purge_deleted_feeds_with_context,
+                'trigger': 'interval',
+                'seconds': FEED_PURGE_INTERVAL,
+                'next_run_time': datetime.now() + timedelta(minutes=2),
+                'misfire_grace_time': 300,
+                'max_instances': 1,
+                'coalesce': True,
+                'description': 'Removal of deleted feeds and their articles'
+            },
+            {
+                'id': 'reconcile_webhooks',
+                'func': reconcile_webhooks_with_context,
+                'trigger': 'interval',
+                'seconds': WEBHOOK_RECONCILE_INTERVAL,
+                'next_run_time': datetime.now() + timedelta(minutes=1),
+                'misfire_grace_time': 300,
+                'max_instances': 1,
+                'coalesce': True,
+                'description': 'Webhook subscription registration and pruning'
+            },
             {
                 'id': 'cleanup_expired_accounts',
                 'func': cleanup_expired_accounts_with_context,
@@ -579,7 +601,8 @@ def send_daily_digest_with_context():
         try:
             logger.info("Starting daily digest email send...")
             start_time = datetime.now()
-            send_daily_digest()
+            with profile_queries('send_daily_digest'):
+                send_daily_digest()
             duration = (datetime.now() - start_time).total_seconds()
             logger.info(f"Completed daily digest in {duration:.2f} seconds")
         except Exception as e:
@@ -594,7 +617,8 @@ def send_weekly_digest_with_context():
         try:
             logger.info("Starting weekly digest email send...")
             start_time = datetime.now()
-            send_weekly_digest()
+            with profile_queries('send_weekly_digest'):
+                send_weekly_digest()
             duration = (datetime.now() - start_time).total_seconds()
             logger.info(f"Completed weekly digest in {duration:.2f} seconds")
         except Exception as e:
@@ -609,7 +633,8 @@ def cleanup_expired_accounts_with_context():
         try:
             logger.info("Starting expired accounts cleanup...")
             start_time = datetime.now()
-            cleanup_expired_accounts()
+            with profile_queries('cleanup_expired_accounts'):
+                cleanup_expired_accounts()
             duration = (datetime.now() - start_time).total_seconds()
             logger.info(
                 f"Completed expired accounts cleanup in {duration:.2f} seconds"
@@ -617,3 +642,97 @@ def cleanup_expired_accounts_with_context():
         except Exception as e:
             logger.error(f"Error cleaning up expired accounts: {str(e)}")
             raise
+
+
+def backfill_unprocessed_articles_with_context():
+    from app import app  # Import app here to avoid circular imports
+    from backfill import backfill_unprocessed_articles
+
+    with app.app_context():
+        try:
+            logger.info("Starting unprocessed article backfill...")
+            with profile_queries('backfill_unprocessed_articles'):
+                stats = backfill_unprocessed_articles()
+            logger.info(
+                f"Completed article backfill: {stats['remaining']} articles remaining"
+            )
+        except Exception as e:
+            logger.error(f"Error backfilling unprocessed articles: {str(e)}")
+            raise
+
+
+def rollup_feed_health_with_context():
+    from app import app  # Import app here to avoid circular imports
+    from feed_health import rollup_feed_health
+
+    with app.app_context():
+        try:
+            logger.info("Starting feed health rollup...")
+            with profile_queries('rollup_feed_health'):
+                rollup_feed_health()
+        except Exception as e:
+            logger.error(f"Error rolling up feed health: {str(e)}")
+            raise
+
+
+def apply_article_retention_with_context():
+    from app import app  # Import app here to avoid circular imports
+    from retention import apply_article_retention
+
+    with app.app_context():
+        try:
+            logger.info("Starting article retention...")
+            with profile_queries('apply_article_retention'):
+                apply_article_retention()
+        except Exception as e:
+            logger.error(f"Error applying article retention: {str(e)}")
+            raise
+
+
+def purge_deleted_feeds_with_context():
+    from app import app  # Import app here to avoid circular imports
+
+    with app.app_context():
+        try:
+            start_time = datetime.now()
+            with profile_queries('purge_deleted_feeds'):
+                purged = purge_deleted_feeds()
+            if purged:
+                duration = (datetime.now() - start_time).total_seconds()
+                logger.info(f"Purged {purged} deleted feeds in {duration:.2f} seconds")
+        except Exception as e:
+            logger.error(f"Error purging deleted feeds: {str(e)}")
+            raise
+
+
+def reconcile_webhooks_with_context():
+    from app import app  # Import app here to avoid circular imports
+
+    with app.app_context():
+        try:
+            start_time = datetime.now()
+            with profile_queries('reconcile_webhooks'):
+                result = reconcile_webhooks()
+            duration = (datetime.now() - start_time).total_seconds()
+            logger.info(
+                f"Webhook reconciliation: {result['registered']} registered, "
+                f"{result['pruned']} pruned in {duration:.2f} seconds")
+        except Exception as e:
+            logger.error(f"Error reconciling webhooks: {str(e)}")
+            raise
+
+
+def initial_fetch_with_context():
+    from app import app  # Import app here to avoid circular imports
+    from feed_import import run_initial_fetch
+
+    with app.app_context():
+        try:
+            with profile_queries('initial_fetch'):
+                remaining = run_initial_fetch()
+            if remaining:
+                logger.info(
+                    f"Initial fetch: {remaining} imported feeds still waiting")
+        except Exception as e:
+            logger.error(f"Error fetching imported feeds: {str(e)}")
+            raise
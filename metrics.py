@@ -0,0 +1,194 @@
+"""Minimal in-process metrics exposed in the Prometheus text format."""
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"')
+               for _, value in pairs)
+    return '{' + ','.join(
+        f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        for suffix, labelvalues, extra, value in self._samples():
+            labels = _format_labels(self.labelnames, labelvalues, extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            return [('', key, None, value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """A value that can go up and down, or be computed at scrape time."""
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._callback = callback
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        if self._callback is not None:
+            try:
+                return [('', (), None, self._callback())]
+            except Exception:
+                return []
+        with self._lock:
+            return [('', key, None, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the enclosed block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append(('_bucket', key, ('le', _format_value(bound)), cumulative))
+                samples.append(('_sum', key, None, total))
+                samples.append(('_count', key, None, cumulative))
+        return samples
+
+
+def render_metrics():
+    """Render every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# Feed ingestion
+FEED_STAGE_SECONDS = Histogram(
+    'feed_stage_duration_seconds',
+    'Time spent in each feed processing stage',
+    labelnames=('stage',))
+FEED_PROCESSING_SECONDS = Histogram(
+    'feed_processing_duration_seconds',
+    'Total time spent processing a single feed',
+    labelnames=('outcome',))
+FEEDS_PROCESSED = Counter('feeds_processed_total',
+                          'Feeds processed, by outcome',
+                          labelnames=('outcome',))
+ARTICLES_CREATED = Counter('articles_created_total',
+                           'New articles stored, by whether they were summarized',
+                           labelnames=('summarized',))
+ARTICLES_DEDUPLICATED = Counter(
+    'articles_deduplicated_total',
+    'New articles that reused the summary of an earlier copy, by how the copy was matched',
+    labelnames=('match',))
+
+# LLM usage
+LLM_CALLS = Counter('llm_calls_total',
+                    'Summary generation calls, by outcome',
+                    labelnames=('outcome',))
+LLM_TOKENS = Counter('llm_tokens_total',
+                     'Tokens used by summary generation calls',
+                     labelnames=('kind',))
+LLM_CALL_SECONDS = Histogram('llm_call_duration_seconds',
+                             'Latency of Gemini API calls')
+
+# Scheduler
+SCHEDULER_JOBS_RUNNING = Gauge('scheduler_jobs_running',
+                               'Scheduler jobs submitted to the executor and not yet finished')
@@ -1,15 +1,19 @@
 from datetime import datetime, timedelta
 from app import db
+from signals import content_changed
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+import hashlib
 import secrets
+import zlib
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256))
-    feeds = db.relationship('Feed', backref='user', lazy=True)
+    # Rows owned by a user or feed are removed by ON DELETE CASCADE
+    feeds = db.relationship('Feed', backref='user', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
     # User type field ('user' or 'admin')
     type = db.Column(db.String(20), default='user', nullable=False)
@@ -27,12 +31,28 @@ class User(UserMixin, db.Model):
     summary_length = db.Column(db.String(10), default='medium')  # short, medium, long
     include_critique = db.Column(db.Boolean, default=True)
     focus_areas = db.Column(db.String(200), default='main points, key findings')  # comma-separated focus areas
+
+    # Days to keep articles; None uses ARTICLE_RETENTION_DAYS, 0 keeps them forever
+    article_retention_days = db.Column(db.Integer)
+
+    # Incremented whenever the user's articles change; used for API ETags
+    content_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
+
+    @staticmethod
+    def bump_content_version(user_ids):
+        """Mark the articles of these users as changed; the caller commits"""
+        user_ids = list(set(user_ids))
+        if user_ids:
+            User.query.filter(User.id.in_(user_ids)).update(
+                {User.content_version: User.content_version + 1},
+                synchronize_session=False)
+            content_changed(user_ids)
     
     def generate_verification_token(self):
         self.verification_token = secrets.token_urlsafe(32)
@@ -43,11 +63,13 @@ class Feed(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     url = db.Column(db.String(500), nullable=False)
     title = db.Column(db.String(200))
-    last_checked = db.Column(db.DateTime, default=datetime.utcnow)
+    last_checked = db.Column(db.DateTime)  # set by the first fetch
     status = db.Column(db.String(20), default='pending')  # pending, active, error
+    # Set when the user deletes the feed; purge_deleted_feeds removes it later
+    deleted_at = db.Column(db.DateTime, index=True)
     error_message = db.Column(db.Text)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    articles = db.relationship('Article', backref='feed', lazy=True, cascade='all, delete-orphan')
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    articles = db.relationship('Article', backref='feed', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
     # Feed processing status tracking
     processing_attempts = db.Column(db.Integer, default=0)
@@ -66,20 +88,30 @@ class Feed(db.Model):
     health_score = db.Column(db.Float, default=100.0)  # 0-100 score based on success rate
 
 # Association tables for many-to-many relationships
+# The (tag_id, article_id) indexes cover "articles with tag X" lookups
 article_tags = db.Table('article_tags',
-    db.Column('article_id', db.Integer, db.ForeignKey('article.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    db.Column('article_id', db.Integer, db.ForeignKey('article.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_article_tags_tag_article', 'tag_id', 'article_id')
 )
 
 article_categories = db.Table('article_categories',
-    db.Column('article_id', db.Integer, db.ForeignKey('article.id'), primary_key=True),
-    db.Column('category_id', db.Integer, db.ForeignKey('category.id'), primary_key=True)
+    db.Column('article_id', db.Integer, db.ForeignKey('article.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('category_id', db.Integer, db.ForeignKey('category.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_article_categories_category_article', 'category_id', 'article_id')
+)
+
+# SimHash band index used to find near-duplicate articles, see dedup.py
+article_simhash_band = db.Table('article_simhash_band',
+    db.Column('band', db.SmallInteger, primary_key=True),
+    db.Column('value', db.Integer, primary_key=True),
+    db.Column('article_id', db.Integer, db.ForeignKey('article.id', ondelete='CASCADE'), primary_key=True, index=True)
 )
 
 class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(30), unique=True, nullable=False)  # Reduced from 50 to 30 for better manageability
-    articles = db.relationship('Article', secondary=article_tags, backref=db.backref('tags', lazy='dynamic'))
+    articles = db.relationship('Article', secondary=article_tags, passive_deletes=True, backref=db.backref('tags', lazy='dynamic', passive_deletes=True))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     @staticmethod
@@ -96,17 +128,197 @@ class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
     description = db.Column(db.String(200))
-    articles = db.relationship('Article', secondary=article_categories, backref=db.backref('categories', lazy='dynamic'))
+    articles = db.relationship('Article', secondary=article_categories, passive_deletes=True, backref=db.backref('categories', lazy='dynamic', passive_deletes=True))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class ContentBlob(db.Model):
+    """Compressed article content, stored once per distinct text"""
+    hash = db.Column(db.String(64), primary_key=True)  # sha256 of the UTF-8 text
+    data = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed text
+    size = db.Column(db.Integer, nullable=False)  # uncompressed size in bytes
+    # Refreshed on every store so garbage collection spares blobs in use
+    last_stored_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    COMPRESSION_LEVEL = 6
+
+    @property
+    def text(self):
+        return ContentBlob.decode(self.data)
+
+    @staticmethod
+    def decode(data):
+        return zlib.decompress(data).decode('utf-8')
+
+    @staticmethod
+    def store(text):
+        """Store text if it is not stored yet and return its hash"""
+        raw = text.encode('utf-8')
+        digest = hashlib.sha256(raw).hexdigest()
+        values = dict(hash=digest,
+                      data=zlib.compress(raw, ContentBlob.COMPRESSION_LEVEL),
+                      size=len(raw),
+                      last_stored_at=datetime.utcnow())
+
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            blob = db.session.get(ContentBlob, digest)
+            if blob:
+                blob.last_stored_at = values['last_stored_at']
+            else:
+                db.session.add(ContentBlob(**values))
+            return digest
+
+        # Several feeds can deliver the same text concurrently
+        statement = insert(ContentBlob).values(**values)
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=['hash'],
+                set_={'last_stored_at': statement.excluded.last_stored_at}))
+        return digest
+
 class Article(db.Model):
+    __table_args__ = (
+        # Lets the backfill job walk unprocessed articles in id order cheaply
+        db.Index('ix_article_unprocessed', 'id',
+                 postgresql_where=db.text('processed = false'),
+                 sqlite_where=db.text('processed = 0')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     url = db.Column(db.String(500), nullable=False)
     published_date = db.Column(db.DateTime)
-    content = db.Column(db.Text)
+    # Raw content lives in ContentBlob; rows written before that keep it in
+    # the legacy column until migrate_legacy_content moves it
+    content_hash = db.Column(db.String(64), index=True)
+    legacy_content = db.deferred(db.Column('content', db.Text))
+    content_blob = db.relationship(
+        'ContentBlob',
+        primaryjoin='foreign(Article.content_hash) == ContentBlob.hash',
+        lazy='select',
+        viewonly=True)
     summary = db.Column(db.Text)
     critique = db.Column(db.Text)
     processed = db.Column(db.Boolean, default=False)
-    feed_id = db.Column(db.Integer, db.ForeignKey('feed.id'), nullable=False)
+    summary_attempts = db.Column(db.Integer, default=0)
+    feed_id = db.Column(db.Integer, db.ForeignKey('feed.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # Duplicate detection, see dedup.py
+    canonical_url = db.Column(db.String(500), index=True)
+    simhash = db.Column(db.BigInteger)
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('article.id', ondelete='SET NULL'), index=True)
+
+    @property
+    def content(self):
+        # Text assigned in this session, before the blob can be lazy loaded
+        if '_content_text' in self.__dict__:
+            return self.__dict__['_content_text']
+        if self.content_hash:
+            return self.content_blob.text if self.content_blob else None
+        return self.legacy_content
+
+    @content.setter
+    def content(self, text):
+        self.content_hash = ContentBlob.store(text) if text else None
+        self.legacy_content = None
+        self.__dict__['_content_text'] = text or None
+
+class ArticleArchive(db.Model):
+    """Summary-only copy of an article removed by the retention policy"""
+    id = db.Column(db.Integer, primary_key=True)  # id of the original article
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    feed_id = db.Column(db.Integer)  # the feed may since have been deleted
+    title = db.Column(db.String(200), nullable=False)
+    url = db.Column(db.String(500), nullable=False)
+    published_date = db.Column(db.DateTime)
+    summary = db.Column(db.Text)
+    critique = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class JobCheckpoint(db.Model):
+    """Resume position of a long-running background job"""
+    name = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.String(100))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class FeedPollResult(db.Model):
+    """Outcome of a single feed poll; rolled up into FeedHealthHourly"""
+    __table_args__ = (
+        db.Index('ix_feed_poll_result_feed_polled', 'feed_id', 'polled_at'),
+    )
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    feed_id = db.Column(db.Integer, db.ForeignKey('feed.id', ondelete='CASCADE'), nullable=False)
+    polled_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    duration = db.Column(db.Float, nullable=False)  # in seconds
+    bytes_received = db.Column(db.Integer, default=0)
+    new_entries = db.Column(db.Integer, default=0)
+    http_status = db.Column(db.SmallInteger)
+    error_class = db.Column(db.String(100))  # exception class name for failed polls
+    success = db.Column(db.Boolean, nullable=False)
+
+class FeedHealthHourly(db.Model):
+    """Per-feed poll statistics aggregated into hourly buckets"""
+    feed_id = db.Column(db.Integer, db.ForeignKey('feed.id', ondelete='CASCADE'), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True, index=True)  # start of the hour (UTC)
+    poll_count = db.Column(db.Integer, default=0, nullable=False)
+    error_count = db.Column(db.Integer, default=0, nullable=False)
+    total_duration = db.Column(db.Float, default=0.0, nullable=False)
+    max_duration = db.Column(db.Float, default=0.0, nullable=False)
+    total_bytes = db.Column(db.BigInteger, default=0, nullable=False)
+    new_entries = db.Column(db.Integer, default=0, nullable=False)
+    # Poll counts per POLL_DURATION_BUCKETS upper bound, used for percentiles
+    duration_histogram = db.Column(db.JSON)
+
+class ImportJob(db.Model):
+    """Progress of an OPML import and of the initial fetch of its new feeds"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    filename = db.Column(db.String(255))
+    status = db.Column(db.String(20), default='fetching')  # fetching, completed
+    total_entries = db.Column(db.Integer, default=0)  # feed outlines in the file
+    imported_count = db.Column(db.Integer, default=0)
+    skipped_count = db.Column(db.Integer, default=0)
+    feed_ids = db.Column(db.JSON)  # ids of the feeds this import created
+    fetched_count = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class UserTagCount(db.Model):
+    """Number of a user's articles with a tag, maintained by topic_counts"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True)
+    article_count = db.Column(db.Integer, nullable=False, default=0)
+
+    tag = db.relationship('Tag')
+
+    __table_args__ = (
+        db.Index('ix_user_tag_count_user_count', 'user_id', 'article_count'),
+    )
+
+class UserCategoryCount(db.Model):
+    """Number of a user's articles in a category, maintained by topic_counts"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id', ondelete='CASCADE'), primary_key=True)
+    article_count = db.Column(db.Integer, nullable=False, default=0)
+
+    category = db.relationship('Category')
+
+    __table_args__ = (
+        db.Index('ix_user_category_count_user_count', 'user_id', 'article_count'),
+    )
+
+class WebhookSubscription(db.Model):
+    """Hub subscription for a feed URL, shared by every feed with that URL"""
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(500), unique=True, nullable=False)  # the feed URL
+    subscription_id = db.Column(db.String(100))  # None until registered
+    secret = db.Column(db.String(64))  # HMAC key the hub signs deliveries with
+    registered_at = db.Column(db.DateTime)
+    last_attempt_at = db.Column(db.DateTime)
+    last_error = db.Column(db.String(500))
@@ -0,0 +1,169 @@
+"""Set-based deletion of accounts and feeds together with what they own.
+
+Deleted feeds are only marked with deleted_at by the request, which hides
+them and their articles. purge_deleted_feeds removes them later.
+
+Rows are removed with DELETE ... WHERE ... IN statements instead of being
+loaded and deleted one by one through the ORM. Articles go first, at most
+PURGE_BATCH_SIZE per transaction, so each batch does a bounded amount of
+work however many articles there are. Their tag, category and SimHash band
+rows are deleted with them (retention.delete_articles), since SQLite
+databases created before the foreign keys cascaded still reject the delete
+otherwise. Rows that reference the deleted feeds and users (poll results,
+topic counts, imports) are removed by the database through their
+ON DELETE CASCADE foreign keys.
+"""
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import delete, func, select, update
+
+from app import db
+from models import User, Feed, Article
+from retention import delete_articles
+from signals import account_changed
+from topic_counts import rebuild_topic_counts
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_CLEANUP_BATCH_SIZE = int(os.environ.get('ACCOUNT_CLEANUP_BATCH_SIZE', 100))  # users
+PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 2000))  # articles
+FEED_PURGE_INTERVAL = int(os.environ.get('FEED_PURGE_INTERVAL', 600))  # seconds
+
+
+def purge_articles(feed_ids, batch_size=PURGE_BATCH_SIZE):
+    """Delete the articles of some feeds in batches, committing each batch.
+
+    Args:
+        feed_ids: Feed ids, as a list or a select() of ids.
+
+    Returns:
+        int: The number of articles deleted.
+    """
+    deleted = 0
+    while True:
+        article_ids = db.session.scalars(
+            select(Article.id).where(Article.feed_id.in_(feed_ids)).limit(batch_size)).all()
+        if not article_ids:
+            return deleted
+        delete_articles(article_ids)
+        db.session.commit()
+        deleted += len(article_ids)
+        if len(article_ids) < batch_size:
+            return deleted
+
+
+def _expired_accounts():
+    return select(User.id).where(
+        User.email_verified == False,
+        User.verification_token.is_not(None),
+        User.verification_token_expires <= datetime.utcnow())
+
+
+def _delete_accounts(user_ids, purge_batch_size):
+    """Delete these users with their feeds and articles; returns the counts."""
+    feeds = select(Feed.id).where(Feed.user_id.in_(user_ids))
+    article_count = purge_articles(feeds, purge_batch_size)
+    feed_count = db.session.execute(
+        delete(Feed).where(Feed.user_id.in_(user_ids)),
+        execution_options={'synchronize_session': False}).rowcount
+    db.session.execute(
+        delete(User).where(User.id.in_(user_ids)),
+        execution_options={'synchronize_session': False})
+    account_changed(user_ids)
+    db.session.commit()
+    return feed_count, article_count
+
+
+def delete_expired_accounts(batch_size=ACCOUNT_CLEANUP_BATCH_SIZE,
+                            purge_batch_size=PURGE_BATCH_SIZE):
+    """Delete unverified accounts whose verification token has expired.
+
+    When a batch fails its users are retried one by one; users that still
+    fail are logged and skipped for the rest of the run.
+
+    Returns:
+        int: The number of accounts deleted.
+    """
+    deleted = 0
+    failed_ids = set()
+    while True:
+        query = _expired_accounts()
+        if failed_ids:
+            query = query.where(User.id.not_in(failed_ids))
+        user_ids = db.session.scalars(query.order_by(User.id).limit(batch_size)).all()
+        if not user_ids:
+            return deleted
+
+        try:
+            feed_count, article_count = _delete_accounts(user_ids, purge_batch_size)
+        except Exception as e:
+            logger.error(f"Error deleting expired accounts {user_ids}: {str(e)}")
+            db.session.rollback()
+            for user_id in user_ids:
+                try:
+                    _delete_accounts([user_id], purge_batch_size)
+                    deleted += 1
+                except Exception as e:
+                    logger.error(f"Error deleting expired account {user_id}: {str(e)}")
+                    db.session.rollback()
+                    failed_ids.add(user_id)
+            continue
+
+        deleted += len(user_ids)
+        logger.info(
+            f"Deleted {len(user_ids)} expired unverified accounts with "
+            f"{feed_count} feeds and {article_count} articles ({deleted} so far)")
+
+
+def _record_purge_failure(feed_id, error):
+    # Deleted feeds are no longer processed, so their error fields are free
+    try:
+        db.session.execute(
+            update(Feed).where(Feed.id == feed_id).values(
+                error_message=f"Purge failed: {str(error)}",
+                failure_count=func.coalesce(Feed.failure_count, 0) + 1,
+                last_failed_process=datetime.utcnow()),
+            execution_options={'synchronize_session': False})
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Error recording purge failure of feed {feed_id}: {str(e)}")
+        db.session.rollback()
+
+
+def purge_deleted_feeds(batch_size=PURGE_BATCH_SIZE):
+    """Remove feeds marked as deleted, their articles first, in batches.
+
+    Webhook subscriptions left without a feed are unregistered by the
+    webhook reconciliation job. A feed that fails is logged and skipped; its
+    error_message, failure_count and last_failed_process record the failure,
+    and feeds that failed most recently are retried last.
+
+    Returns:
+        int: The number of feeds removed.
+    """
+    feeds = db.session.query(Feed.id, Feed.user_id).filter(
+        Feed.deleted_at.isnot(None)).order_by(
+            Feed.last_failed_process.asc().nullsfirst(), Feed.deleted_at).all()
+
+    purged = 0
+    for feed_id, user_id in feeds:
+        try:
+            article_count = purge_articles([feed_id], batch_size)
+            db.session.execute(
+                delete(Feed).where(Feed.id == feed_id),
+                execution_options={'synchronize_session': False})
+            # Copies of the removed articles in other feeds are now originals
+            rebuild_topic_counts([user_id])
+            User.bump_content_version([user_id])
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error purging deleted feed {feed_id}: {str(e)}")
+            db.session.rollback()
+            _record_purge_failure(feed_id, e)
+            continue
+
+        purged += 1
+        logger.info(f"Purged deleted feed {feed_id} with {article_count} articles")
+    return purged
@@ -0,0 +1,158 @@
+"""Opt-in SQL query counting, slow-query logging and N+1 detection.
+
+Enable with SQL_PROFILING=1. Every HTTP request and every block wrapped in
+profile_queries() then logs its statement count and total database time,
+statements slower than SQL_SLOW_QUERY_MS together with the code that issued
+them, and identical statements repeated SQL_REPEATED_QUERY_THRESHOLD or more
+times, which usually means an N+1 query pattern. Requests also get a
+Server-Timing header with the same numbers.
+"""
+import contextvars
+import logging
+import os
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+SQL_PROFILING = os.environ.get('SQL_PROFILING', '').lower() in ('1', 'true', 'yes')
+SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS', 100))
+SQL_REPEATED_QUERY_THRESHOLD = int(
+    os.environ.get('SQL_REPEATED_QUERY_THRESHOLD', 5))
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+_current_profile = contextvars.ContextVar('query_profile', default=None)
+
+
+class QueryProfile:
+    """Statement statistics collected for one request or job."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = Counter()
+        self.call_sites = {}
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total_time += duration
+        self.statements[statement] += 1
+
+        # Only pay for a stack walk when the statement is worth reporting
+        if self.statements[statement] == SQL_REPEATED_QUERY_THRESHOLD:
+            self.call_sites[statement] = _call_site()
+        if duration * 1000 >= SQL_SLOW_QUERY_MS:
+            logger.warning(
+                f"Slow query ({duration * 1000:.1f}ms) in {self.name} at {_call_site()}: "
+                f"{_shorten(statement)}")
+
+    def merge(self, other):
+        self.count += other.count
+        self.total_time += other.total_time
+        self.statements.update(other.statements)
+        for statement, site in other.call_sites.items():
+            self.call_sites.setdefault(statement, site)
+
+    def report(self):
+        logger.info(
+            f"{self.name}: {self.count} queries in {self.total_time * 1000:.1f}ms")
+        for statement, count in self.statements.most_common():
+            if count < SQL_REPEATED_QUERY_THRESHOLD:
+                break
+            logger.warning(
+                f"Possible N+1 in {self.name}: statement ran {count} times, "
+                f"first repeated at {self.call_sites.get(statement, 'unknown')}: "
+                f"{_shorten(statement)}")
+
+
+def _shorten(statement, limit=300):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + '...'
+
+
+def _call_site():
+    """Return the innermost application frame outside this module."""
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        filename = os.path.abspath(frame.filename)
+        if (filename.startswith(_PROJECT_DIR) and filename != os.path.abspath(__file__)
+                and 'site-packages' not in filename):
+            return f"{os.path.relpath(filename, _PROJECT_DIR)}:{frame.lineno} in {frame.name}"
+    return 'unknown'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    start_times = conn.info.get('query_start_time')
+    if profile is None or not start_times:
+        return
+    profile.record(statement, time.perf_counter() - start_times.pop())
+
+
+@contextmanager
+def profile_queries(name):
+    """Collect query statistics for the enclosed block when profiling is enabled.
+
+    Nested blocks are reported on their own and also added to the enclosing
+    profile.
+    """
+    if not SQL_PROFILING:
+        yield None
+        return
+
+    parent = _current_profile.get()
+    profile = QueryProfile(name)
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+        profile.report()
+        if parent is not None:
+            parent.merge(profile)
+
+
+def init_query_profiler(app, engine):
+    """Attach the profiler to an engine and to the app's request lifecycle."""
+    if not SQL_PROFILING:
+        return
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_request_profile():
+        profile = QueryProfile(f"{request.method} {request.path}")
+        g.query_profile = profile
+        g.query_profile_token = _current_profile.set(profile)
+
+    @app.after_request
+    def add_query_profile_header(response):
+        profile = g.get('query_profile')
+        if profile is not None:
+            response.headers['Server-Timing'] = (
+                f'db;desc="{profile.count} queries";dur={profile.total_time * 1000:.1f}')
+        return response
+
+    @app.teardown_request
+    def finish_request_profile(exception=None):
+        profile = g.pop('query_profile', None)
+        token = g.pop('query_profile_token', None)
+        if token is not None:
+            _current_profile.reset(token)
+        if profile is not None:
+            profile.report()
+
+    logger.info(
+        f"SQL profiling enabled (slow query threshold {SQL_SLOW_QUERY_MS}ms, "
+        f"repeat threshold {SQL_REPEATED_QUERY_THRESHOLD})")
@@ -0,0 +1,156 @@
+"""Thread-safe client-side throttling primitives for external APIs."""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Adaptive token-bucket rate limiter shared between threads.
+
+    The refill rate starts at `requests_per_minute`. Each rate-limit response
+    halves it (down to `min_requests_per_minute`) and each success raises it
+    again in small steps, so the limiter settles just under the real quota.
+    """
+
+    def __init__(self,
+                 requests_per_minute,
+                 burst=1,
+                 min_requests_per_minute=1,
+                 recovery_step=0.05):
+        self.max_rate = requests_per_minute / 60.0
+        self.min_rate = min(min_requests_per_minute / 60.0, self.max_rate)
+        self.rate = self.max_rate
+        self.capacity = max(1, burst)
+        self.recovery_step = recovery_step
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def acquire(self, timeout=None):
+        """Block until a request may be sent.
+
+        Returns:
+            bool: False if no token became available within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = max(self._blocked_until - now,
+                           (1 - self._tokens) / self.rate)
+
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def penalize(self, retry_after=None):
+        """Slow down after a rate-limit response.
+
+        Args:
+            retry_after: Seconds the server asked us to wait, if it said so.
+        """
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            if retry_after:
+                self._blocked_until = max(self._blocked_until,
+                                          time.monotonic() + retry_after)
+        logger.warning(
+            f"Rate limited: reduced to {self.rate * 60:.1f} requests/min"
+            + (f", pausing for {retry_after:.1f}s" if retry_after else ""))
+
+    def reward(self):
+        """Gradually restore the rate after a successful request."""
+        with self._lock:
+            self.rate = min(self.max_rate,
+                            self.rate + self.max_rate * self.recovery_step)
+
+
+class CircuitBreaker:
+    """Stop calling a degraded service until it has had time to recover.
+
+    After `failure_threshold` consecutive failures the circuit opens and all
+    calls are rejected for `reset_timeout` seconds. It then lets a single
+    trial call through (half-open); success closes it, failure reopens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=300):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_until = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Return True if a call may be made now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.monotonic() >= self._opened_until:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+                logger.info(f"Circuit '{self.name}' half-open, allowing a trial call")
+
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def is_open(self):
+        """Return True while calls are being rejected outright."""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() < self._opened_until
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Give back a trial call allowed by allow_request that was not made."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open(self.reset_timeout)
+
+    def trip(self, duration):
+        """Open the circuit for at least `duration` seconds."""
+        with self._lock:
+            self._open(duration)
+
+    def _open(self, duration):
+        self.state = self.OPEN
+        self._trial_in_flight = False
+        self._opened_until = max(self._opened_until,
+                                 time.monotonic() + duration)
+        logger.warning(
+            f"Circuit '{self.name}' open for {duration:.0f}s after {self._failures} consecutive failures"
+        )
@@ -0,0 +1,92 @@
+"""Lightweight read models for the pages and emails that list articles.
+
+List views query only the columns they render through the load profiles
+below, then turn the rows into ArticleView tuples with the tag and category
+names fetched in one query each, instead of two lazy queries per article.
+The views are plain values, so rendering markdown into them never dirties
+ORM objects.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy.orm import contains_eager, load_only
+
+from app import db
+from models import Feed, Article, Tag, Category, article_tags, article_categories
+
+# Columns rendered by each list view; content is never part of a profile
+ARTICLE_CARD_COLUMNS = (Article.title, Article.url, Article.published_date,
+                        Article.created_at, Article.summary)
+ARTICLE_DETAIL_COLUMNS = ARTICLE_CARD_COLUMNS + (Article.critique, )
+
+
+class ArticleView(NamedTuple):
+    id: int
+    title: str
+    url: str
+    published_date: Optional[datetime]
+    created_at: Optional[datetime]
+    summary: Optional[str]
+    critique: Optional[str]
+    feed_title: Optional[str]
+    tags: List[str]
+    categories: List[str]
+
+
+def with_load_profile(query, columns):
+    """Restrict an Article query joined to Feed to `columns` and the feed title."""
+    return query.options(
+        load_only(*columns),
+        contains_eager(Article.feed).load_only(Feed.title))
+
+
+def _names_by_article(association, model, foreign_key, article_ids):
+    """Map article ids to the sorted names of their tags or categories."""
+    names = defaultdict(list)
+    rows = db.session.query(association.c.article_id, model.name).join(
+        model, model.id == foreign_key).filter(
+            association.c.article_id.in_(article_ids)).order_by(model.name)
+    for article_id, name in rows:
+        names[article_id].append(name)
+    return names
+
+
+def article_views(articles, render=None):
+    """Build ArticleViews for articles loaded with a load profile.
+
+    Args:
+        articles: Article instances whose feed was loaded with the query.
+        render: Optional function applied to summaries and critiques, such
+            as markdown conversion.
+    """
+    article_ids = [article.id for article in articles]
+    if not article_ids:
+        return []
+
+    tags = _names_by_article(article_tags, Tag, article_tags.c.tag_id,
+                             article_ids)
+    categories = _names_by_article(article_categories, Category,
+                                   article_categories.c.category_id,
+                                   article_ids)
+
+    views = []
+    for article in articles:
+        summary = article.summary
+        # Profiles without critique leave it unloaded; do not lazy load it
+        critique = article.__dict__.get('critique')
+        if render:
+            summary = render(summary) if summary else summary
+            critique = render(critique) if critique else critique
+        views.append(ArticleView(
+            id=article.id,
+            title=article.title,
+            url=article.url,
+            published_date=article.published_date,
+            created_at=article.created_at,
+            summary=summary,
+            critique=critique,
+            feed_title=article.feed.title if article.feed else None,
+            tags=tags.get(article.id, []),
+            categories=categories.get(article.id, [])))
+    return views
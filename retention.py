@@ -0,0 +1,202 @@
+"""Article retention: prune or archive old articles and drop summarized content.
+
+Articles older than a user's retention period (User.article_retention_days,
+falling back to ARTICLE_RETENTION_DAYS) are deleted, or copied to
+ArticleArchive without their content first when ARTICLE_RETENTION_MODE is
+'archive'. Raw content of summarized articles is cleared after
+CONTENT_RETENTION_HOURS and content blobs no article references any more
+are deleted. All work happens in short batches with a pause in
+between so the job never holds long locks, and on Postgres the touched
+tables are vacuumed afterwards so the freed space is reused.
+"""
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, literal, or_, select, text
+
+from app import db
+from content_store import migrate_legacy_content, collect_orphaned_blobs
+from models import (User, Feed, Article, ArticleArchive, article_tags,
+                    article_categories, article_simhash_band)
+from topic_counts import remove_article_topics
+
+logger = logging.getLogger(__name__)
+
+ARTICLE_RETENTION_DAYS = int(os.environ.get('ARTICLE_RETENTION_DAYS', 180))
+ARTICLE_RETENTION_MODE = os.environ.get('ARTICLE_RETENTION_MODE', 'delete')  # delete, archive
+# Hours after which summarized articles lose their raw content; 0 keeps it
+CONTENT_RETENTION_HOURS = int(os.environ.get('CONTENT_RETENTION_HOURS', 72))
+RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', 500))
+RETENTION_BATCH_PAUSE = float(os.environ.get('RETENTION_BATCH_PAUSE', 0.2))  # seconds
+RETENTION_VACUUM = os.environ.get('RETENTION_VACUUM', 'true').lower() in ('1', 'true', 'yes')
+
+# Keeps IN (...) lists of user ids at a reasonable size
+_USER_CHUNK_SIZE = 500
+
+
+def _retention_groups():
+    """Map each retention period in days to the ids of the users it applies to."""
+    groups = defaultdict(list)
+    for user_id, days in db.session.query(User.id, User.article_retention_days):
+        days = ARTICLE_RETENTION_DAYS if days is None else days
+        if days > 0:
+            groups[days].append(user_id)
+    return groups
+
+
+def _archive_articles(article_ids, archived_at):
+    columns = [Article.id, Feed.user_id, Article.feed_id, Article.title,
+               Article.url, Article.published_date, Article.summary,
+               Article.critique, Article.created_at]
+    db.session.execute(
+        insert(ArticleArchive).from_select(
+            ['id', 'user_id', 'feed_id', 'title', 'url', 'published_date',
+             'summary', 'critique', 'created_at', 'archived_at'],
+            select(*columns, literal(archived_at, db.DateTime)).join(
+                Feed, Article.feed_id == Feed.id).where(
+                    Article.id.in_(article_ids))))
+
+
+def delete_articles(article_ids):
+    """Delete articles and the rows that reference them; the caller commits.
+
+    The association rows are removed explicitly because SQLite databases
+    created before the foreign keys cascaded still reject the delete.
+    """
+    db.session.execute(article_tags.delete().where(
+        article_tags.c.article_id.in_(article_ids)))
+    db.session.execute(article_simhash_band.delete().where(
+        article_simhash_band.c.article_id.in_(article_ids)))
+    # Copies of a removed story become regular articles
+    Article.query.filter(Article.duplicate_of_id.in_(article_ids)).update(
+        {Article.duplicate_of_id: None}, synchronize_session=False)
+    db.session.execute(article_categories.delete().where(
+        article_categories.c.article_id.in_(article_ids)))
+    Article.query.filter(Article.id.in_(article_ids)).delete(
+        synchronize_session=False)
+
+
+def prune_articles(mode=ARTICLE_RETENTION_MODE,
+                   batch_size=RETENTION_BATCH_SIZE,
+                   pause=RETENTION_BATCH_PAUSE):
+    """Delete or archive articles older than their owner's retention period.
+
+    Returns:
+        int: The number of articles removed from the article table.
+    """
+    if mode not in ('delete', 'archive'):
+        raise ValueError(f"Unknown article retention mode '{mode}'")
+
+    now = datetime.utcnow()
+    removed = 0
+    for days, user_ids in sorted(_retention_groups().items()):
+        cutoff = now - timedelta(days=days)
+        for start in range(0, len(user_ids), _USER_CHUNK_SIZE):
+            chunk = user_ids[start:start + _USER_CHUNK_SIZE]
+            while True:
+                article_ids = [
+                    article_id for (article_id, ) in db.session.query(
+                        Article.id).join(Feed, Article.feed_id == Feed.id).
+                    filter(Feed.user_id.in_(chunk), Article.created_at < cutoff).
+                    order_by(Article.id).limit(batch_size)
+                ]
+                if not article_ids:
+                    break
+
+                changed_users = [
+                    user_id for (user_id, ) in db.session.query(
+                        Feed.user_id).join(Article, Article.feed_id == Feed.id).
+                    filter(Article.id.in_(article_ids)).distinct()
+                ]
+                if mode == 'archive':
+                    _archive_articles(article_ids, now)
+                # Before the delete, while the batch's tags are still there
+                remove_article_topics(article_ids)
+                delete_articles(article_ids)
+                User.bump_content_version(changed_users)
+                db.session.commit()
+                removed += len(article_ids)
+                logger.info(
+                    f"Retention: {mode}d {len(article_ids)} articles older than "
+                    f"{days} days ({removed} so far)")
+                time.sleep(pause)
+    return removed
+
+
+def strip_summarized_content(hours=CONTENT_RETENTION_HOURS,
+                             batch_size=RETENTION_BATCH_SIZE,
+                             pause=RETENTION_BATCH_PAUSE):
+    """Clear the raw content of summarized articles older than `hours`.
+
+    Unprocessed articles keep their content so the backfill can still
+    summarize them.
+
+    Returns:
+        int: The number of articles whose content was cleared.
+    """
+    if hours <= 0:
+        return 0
+
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+    cleared = 0
+    last_id = 0
+    while True:
+        article_ids = [
+            article_id for (article_id, ) in db.session.query(Article.id).filter(
+                Article.id > last_id, Article.created_at < cutoff,
+                Article.processed == True,
+                or_(Article.content_hash.isnot(None),
+                    Article.legacy_content.isnot(None))).order_by(
+                        Article.id).limit(batch_size)
+        ]
+        if not article_ids:
+            break
+
+        # Blobs nobody references any more are removed by collect_orphaned_blobs
+        Article.query.filter(Article.id.in_(article_ids)).update(
+            {Article.content_hash: None, Article.legacy_content: None},
+            synchronize_session=False)
+        db.session.commit()
+        cleared += len(article_ids)
+        last_id = article_ids[-1]
+        time.sleep(pause)
+    return cleared
+
+
+def _vacuum_analyze(tables):
+    """VACUUM ANALYZE the given tables on Postgres; a no-op elsewhere."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    # VACUUM cannot run inside a transaction block
+    with db.engine.connect().execution_options(
+            isolation_level='AUTOCOMMIT') as connection:
+        for table in tables:
+            start = time.time()
+            connection.execute(text(f"VACUUM (ANALYZE) {table}"))
+            logger.info(f"Vacuumed {table} in {time.time() - start:.2f}s")
+
+
+def apply_article_retention():
+    """Run the full retention policy and return what it changed."""
+    start_time = time.time()
+    try:
+        migrate_legacy_content()
+        removed = prune_articles()
+        cleared = strip_summarized_content()
+        blobs = collect_orphaned_blobs()
+        if RETENTION_VACUUM and (removed or cleared or blobs):
+            _vacuum_analyze(['article', 'article_tags', 'article_categories',
+                             'content_blob'])
+    except Exception as e:
+        logger.error(f"Error in apply_article_retention: {str(e)}")
+        db.session.rollback()
+        raise
+
+    logger.info(
+        f"Article retention finished in {time.time() - start_time:.2f}s: "
+        f"{removed} articles {ARTICLE_RETENTION_MODE}d, content cleared from {cleared}, "
+        f"{blobs} content blobs deleted")
+    return {'removed': removed, 'content_cleared': cleared, 'blobs_deleted': blobs}
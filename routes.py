@@ -1,24 +1,33 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify, make_response
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, make_response
 from flask_login import login_user, logout_user, login_required, current_user
-from app import app, db
-from models import User, Feed, Article, Tag, Category
-from feed_processor import schedule_feed_processing, process_feeds
+from app import db
+from models import (User, Feed, Article, Tag, Category, ImportJob, WebhookSubscription,
+                    article_tags, article_categories)
+from feed_processor import (schedule_feed_processing, schedule_initial_fetch, schedule_feed_purge,
+                            schedule_webhook_reconcile, process_feeds)
 from feed_processor import send_daily_digest_with_context, send_weekly_digest_with_context
 from datetime import datetime
-from sqlalchemy import or_, desc, nullslast
+from sqlalchemy import or_, desc, nullslast, func, select
 from urllib.parse import urlparse
-from webhook_service import verify_webhook_signature
-from markdown import markdown
-import bleach
+from webhook_service import verify_webhook_signature, is_duplicate_delivery
 from email_service import send_verification_email
+from metrics import render_metrics
+from feed_health import feed_health_summary
+from feed_import import import_opml_feeds, import_progress
+from dashboard_cache import DashboardData, get_dashboard_data
+from signals import content_changed
+from topic_counts import top_tags, top_categories
+from retention import ARTICLE_RETENTION_DAYS
+from read_models import (ARTICLE_CARD_COLUMNS, ARTICLE_DETAIL_COLUMNS,
+                         with_load_profile, article_views)
 import logging
 import requests
 import os
-import feedparser
-import opml
 
 logger = logging.getLogger(__name__)
 
+bp = Blueprint('main', __name__)
+
 
 def verify_recaptcha(token):
     try:
@@ -82,6 +91,10 @@ def verify_recaptcha(token):
 
 def convert_markdown_to_html(text):
     # Convert markdown to HTML and sanitize
+    # Imported on first use; only pages with summaries need them
+    from markdown import markdown
+    import bleach
+
     allowed_tags = [
         'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'em', 'ul', 'ol',
         'li', 'code', 'pre', 'blockquote'
@@ -95,29 +108,29 @@ def convert_markdown_to_html(text):
     return clean_html
 
 
-@app.route('/')
+@bp.route('/')
 def index():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('login'))
+        return redirect(url_for('main.dashboard'))
+    return redirect(url_for('main.login'))
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         user = User.query.filter_by(username=request.form['username']).first()
         if user and user.check_password(request.form['password']):
             if not user.email_verified:
                 flash('Please verify your email address before logging in.')
-                return redirect(url_for('login'))
+                return redirect(url_for('main.login'))
 
             login_user(user)
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         flash('Invalid username or password')
     return render_template('login.html')
 
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         try:
@@ -126,19 +139,19 @@ def register():
                 flash(
                     'Please ensure JavaScript is enabled for reCAPTCHA validation'
                 )
-                return redirect(url_for('register'))
+                return redirect(url_for('main.register'))
 
             if not verify_recaptcha(recaptcha_token):
                 flash('reCAPTCHA verification failed. Please try again')
-                return redirect(url_for('register'))
+                return redirect(url_for('main.register'))
 
             if User.query.filter_by(username=request.form['username']).first():
                 flash('Username already exists')
-                return redirect(url_for('register'))
+                return redirect(url_for('main.register'))
 
             if User.query.filter_by(email=request.form['email']).first():
                 flash('Email already registered')
-                return redirect(url_for('register'))
+                return redirect(url_for('main.register'))
 
             user = User(username=request.form['username'],
                         email=request.form['email'],
@@ -169,27 +182,27 @@ def register():
                     'Registration successful but there was an error sending the verification email. Please contact support.'
                 )
 
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
 
         except Exception as e:
             logger.error(f"Registration error: {str(e)}")
             flash('An error occurred during registration. Please try again')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
 
     return render_template('register.html')
 
 
-@app.route('/verify-email/<token>')
+@bp.route('/verify-email/<token>')
 def verify_email(token):
     user = User.query.filter_by(verification_token=token).first()
 
     if not user:
         flash('Invalid verification link')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     if datetime.utcnow() > user.verification_token_expires:
         flash('Verification link has expired. Please request a new one.')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     user.email_verified = True
     user.verification_token = None
@@ -197,25 +210,25 @@ def verify_email(token):
     db.session.commit()
 
     flash('Email verified successfully! You can now log in.')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 
-@app.route('/resend-verification', methods=['GET', 'POST'])
+@bp.route('/resend-verification', methods=['GET', 'POST'])
 def resend_verification():
     if request.method == 'POST':
         email = request.form.get('email')
         if not email:
             flash('Please provide an email address.')
-            return redirect(url_for('resend_verification'))
+            return redirect(url_for('main.resend_verification'))
 
         user = User.query.filter_by(email=email).first()
         if not user:
             flash('No account found with that email address.')
-            return redirect(url_for('resend_verification'))
+            return redirect(url_for('main.resend_verification'))
 
         if user.email_verified:
             flash('This email address is already verified.')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
 
         token = user.generate_verification_token()
         db.session.commit()
@@ -225,12 +238,12 @@ def resend_verification():
         else:
             flash('Error sending verification email. Please try again later.')
 
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     return render_template('resend_verification.html')
 
 
-@app.route('/settings', methods=['GET', 'POST'])
+@bp.route('/settings', methods=['GET', 'POST'])
 @login_required
 def settings():
     if request.method == 'POST':
@@ -243,13 +256,19 @@ def settings():
         current_user.include_critique = 'include_critique' in request.form
         current_user.focus_areas = request.form['focus_areas']
 
+        # Article retention; an empty value falls back to the site default
+        retention_days = request.form.get('article_retention_days', '')
+        current_user.article_retention_days = int(
+            retention_days) if retention_days.isdigit() else None
+
         db.session.commit()
         flash('Settings updated successfully')
-        return redirect(url_for('settings'))
-    return render_template('settings.html')
+        return redirect(url_for('main.settings'))
+    return render_template('settings.html',
+                           default_retention_days=ARTICLE_RETENTION_DAYS)
 
 
-@app.route('/change-password', methods=['POST'])
+@bp.route('/change-password', methods=['POST'])
 @login_required
 def change_password():
     current_password = request.form.get('current_password')
@@ -258,182 +277,188 @@ def change_password():
 
     if not current_password or not new_password or not confirm_password:
         flash('All password fields are required')
-        return redirect(url_for('settings'))
+        return redirect(url_for('main.settings'))
 
     if not current_user.check_password(current_password):
         flash('Current password is incorrect')
-        return redirect(url_for('settings'))
+        return redirect(url_for('main.settings'))
 
     if new_password != confirm_password:
         flash('New passwords do not match')
-        return redirect(url_for('settings'))
+        return redirect(url_for('main.settings'))
 
     if len(new_password) < 8:
         flash('New password must be at least 8 characters long')
-        return redirect(url_for('settings'))
+        return redirect(url_for('main.settings'))
 
     current_user.set_password(new_password)
     db.session.commit()
 
     flash('Password changed successfully')
-    return redirect(url_for('settings'))
+    return redirect(url_for('main.settings'))
 
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
 def dashboard():
-    # Get feeds but don't use status column
-    feeds = Feed.query.filter_by(user_id=current_user.id).all()
-    recent_articles = Article.query.join(Feed).filter(
-        Feed.user_id == current_user.id).order_by(
-            nullslast(desc(Article.published_date))).limit(10).all()
+    user_id = current_user.id
+    data = get_dashboard_data(user_id, lambda: _load_dashboard(user_id))
+    return render_template('dashboard.html',
+                           feed_count=data.feed_count,
+                           articles=data.articles)
 
-    for article in recent_articles:
-        if article.summary:
-            article.summary = convert_markdown_to_html(article.summary)
 
-    return render_template('dashboard.html',
-                           feeds=feeds,
-                           articles=recent_articles)
+def _load_dashboard(user_id):
+    feed_count = Feed.query.filter_by(user_id=user_id, deleted_at=None).count()
+    recent_articles = with_load_profile(
+        Article.query.join(Feed), ARTICLE_CARD_COLUMNS).filter(
+            Feed.user_id == user_id,
+            Feed.deleted_at.is_(None),
+            Article.duplicate_of_id.is_(None)).order_by(
+                nullslast(desc(Article.published_date))).limit(10).all()
+    return DashboardData(feed_count=feed_count,
+                         articles=article_views(
+                             recent_articles,
+                             render=convert_markdown_to_html))
 
 
-@app.route('/feeds', methods=['GET', 'POST'])
+@bp.route('/feeds', methods=['GET', 'POST'])
 @login_required
 def manage_feeds():
     if request.method == 'POST':
         feed_url = request.form['url']
-        parsed = feedparser.parse(feed_url)
-        title = parsed.feed.get('title', urlparse(feed_url).netloc)
-
-        new_feed = Feed(
-            url=feed_url,
-            title=title[:200] if title else
-            urlparse(feed_url).netloc[:200],  # Truncate to 200 chars
-            user_id=current_user.id)
+
+        # The first fetch replaces the placeholder title with the feed's own
+        new_feed = Feed(url=feed_url,
+                        title=urlparse(feed_url).netloc[:200],
+                        user_id=current_user.id)
         db.session.add(new_feed)
+        content_changed([current_user.id])
         db.session.commit()
 
         schedule_feed_processing(new_feed.id)
+        schedule_webhook_reconcile()
         flash('Feed added successfully. Processing will begin shortly.')
-        return redirect(url_for('manage_feeds'))
+        return redirect(url_for('main.manage_feeds'))
 
-    feeds = Feed.query.filter_by(user_id=current_user.id).all()
-    return render_template('feed_manage.html', feeds=feeds)
+    feeds = Feed.query.filter_by(user_id=current_user.id, deleted_at=None).all()
+    imports = ImportJob.query.filter_by(user_id=current_user.id,
+                                        status='fetching').order_by(
+                                            ImportJob.id).all()
+    return render_template('feed_manage.html',
+                           feeds=feeds,
+                           imports=[import_progress(job) for job in imports])
 
 
-@app.route('/feeds/health')
+@bp.route('/feeds/<int:feed_id>/status')
+@login_required
+def feed_status(feed_id):
+    feed = Feed.query.filter_by(id=feed_id,
+                                user_id=current_user.id,
+                                deleted_at=None).first_or_404()
+    return jsonify({
+        'id': feed.id,
+        'title': feed.title,
+        'status': feed.status,
+        'error_message': feed.error_message,
+        'last_checked': feed.last_checked.isoformat() if feed.last_checked else None,
+        'total_articles_processed': feed.total_articles_processed,
+    })
+
+
+@bp.route('/feeds/health')
 @login_required
 def feed_health_dashboard():
-    # Get all feeds for the current user
-    feeds = Feed.query.filter_by(user_id=current_user.id).all()
-
-    # Calculate overall statistics without relying on status
+    feeds = Feed.query.filter_by(user_id=current_user.id, deleted_at=None).all()
     total_feeds = len(feeds)
 
-    # For now, set these to 0 since we don't have status column
-    active_feeds = 0
-    error_feeds = 0
+    status_counts = dict(
+        db.session.query(Feed.status, func.count(Feed.id)).filter(
+            Feed.user_id == current_user.id,
+            Feed.deleted_at.is_(None)).group_by(Feed.status).all())
+    active_feeds = status_counts.get('active', 0)
+    error_feeds = status_counts.get('error', 0)
+
+    total_articles = sum(feed.total_articles_processed or 0 for feed in feeds)
+
+    # Poll history over the last 24 hours, compared with the 24 hours before
+    health, overall_health = feed_health_summary([feed.id for feed in feeds])
 
-    # Calculate total articles if the attribute exists
-    total_articles = sum(
-        getattr(feed, 'total_articles_processed', 0) or 0 for feed in feeds)
+    # Broken feeds first, then the slowest
+    feeds.sort(key=lambda feed: (-(health[feed.id]['error_rate'] or 0),
+                                 -(health[feed.id]['p95_duration'] or 0)))
 
     return render_template('health_dashboard.html',
                            feeds=feeds,
+                           health=health,
+                           overall_health=overall_health,
                            total_feeds=total_feeds,
                            active_feeds=active_feeds,
                            error_feeds=error_feeds,
                            total_articles=total_articles)
 
 
-@app.route('/feeds/import-opml', methods=['POST'])
+@bp.route('/feeds/import-opml', methods=['POST'])
 @login_required
 def import_opml():
     if 'opml_file' not in request.files:
         flash('No file provided')
-        return redirect(url_for('manage_feeds'))
+        return redirect(url_for('main.manage_feeds'))
 
     file = request.files['opml_file']
     if file.filename == '':
         flash('No file selected')
-        return redirect(url_for('manage_feeds'))
+        return redirect(url_for('main.manage_feeds'))
 
     if not file.filename.endswith(('.opml', '.xml')):
         flash('Invalid file type. Please upload an OPML file')
-        return redirect(url_for('manage_feeds'))
+        return redirect(url_for('main.manage_feeds'))
 
     try:
-        # Parse OPML content
-        outline = opml.parse(file)
-        imported_count = 0
-        skipped_count = 0
-
-        def process_outline(outline):
-            nonlocal imported_count, skipped_count
-
-            # Process current level
-            for entry in outline:
-                # Check if entry has xmlUrl (RSS feed)
-                if hasattr(entry, 'xmlUrl'):
-                    # Check if feed already exists
-                    existing_feed = Feed.query.filter_by(
-                        url=entry.xmlUrl, user_id=current_user.id).first()
-
-                    if not existing_feed:
-                        new_feed = Feed(
-                            url=entry.xmlUrl,
-                            title=(getattr(entry, 'text', '') or getattr(
-                                entry, 'title',
-                                ''))[:200],  # Truncate to 200 chars
-                            user_id=current_user.id)
-                        db.session.add(new_feed)
-                        imported_count += 1
-                    else:
-                        skipped_count += 1
-
-                # Process nested outlines (if any exist)
-                if len(
-                        entry
-                ) > 0:  # Using Python sequence operator to check for nested elements
-                    process_outline(
-                        entry)  # Recursively process nested outlines
-
-        # Process the OPML file
-        process_outline(outline)
-
-        # Commit all new feeds
-        db.session.commit()
-
-        # Schedule processing for all new feeds
-        feeds = Feed.query.filter_by(user_id=current_user.id).all()
-        for feed in feeds:
-            schedule_feed_processing(feed.id)
+        # Parsed while streaming; new feeds are fetched a few at a time
+        job = import_opml_feeds(current_user.id, file.stream, file.filename)
+        if job.imported_count:
+            schedule_initial_fetch()
+            schedule_webhook_reconcile()
 
         flash(
-            f'Successfully imported {imported_count} feeds ({skipped_count} skipped as duplicates)'
+            f'Successfully imported {job.imported_count} feeds ({job.skipped_count} skipped as duplicates)'
         )
 
     except Exception as e:
         logger.error(f"Error importing OPML file: {str(e)}")
         flash('Error importing OPML file. Please ensure the file is valid')
 
-    return redirect(url_for('manage_feeds'))
+    return redirect(url_for('main.manage_feeds'))
+
+
+@bp.route('/feeds/imports/<int:job_id>')
+@login_required
+def import_status(job_id):
+    job = ImportJob.query.filter_by(id=job_id,
+                                    user_id=current_user.id).first_or_404()
+    return jsonify(import_progress(job))
 
 
-@app.route('/feeds/<int:feed_id>/delete', methods=['POST'])
+@bp.route('/feeds/<int:feed_id>/delete', methods=['POST'])
 @login_required
 def delete_feed(feed_id):
     feed = Feed.query.get_or_404(feed_id)
     if feed.user_id != current_user.id:
         flash('Unauthorized')
-        return redirect(url_for('manage_feeds'))
+        return redirect(url_for('main.manage_feeds'))
 
-    db.session.delete(feed)
-    db.session.commit()
-    return redirect(url_for('manage_feeds'))
+    # Hidden right away; its articles are removed in the background, and
+    # the topic counts are rebuilt then
+    if not feed.deleted_at:
+        feed.deleted_at = datetime.utcnow()
+        User.bump_content_version([current_user.id])
+        db.session.commit()
+        schedule_feed_purge()
+    return redirect(url_for('main.manage_feeds'))
 
 
-@app.route('/summaries')
+@bp.route('/summaries')
 @login_required
 def summaries():
     page = request.args.get('page', 1, type=int)
@@ -441,8 +466,27 @@ def summaries():
     search_query = request.args.get('q', '')
     filter_type = request.args.get('filter', 'all')
 
-    # Base query
-    query = Article.query.join(Feed).filter(Feed.user_id == current_user.id)
+    # Base query, loading only the columns the page renders; copies of a
+    # story from other feeds are shown once
+    query = with_load_profile(Article.query.join(Feed),
+                              ARTICLE_DETAIL_COLUMNS).filter(
+                                  Feed.user_id == current_user.id,
+                                  Feed.deleted_at.is_(None),
+                                  Article.duplicate_of_id.is_(None))
+
+    # Browsing a topic; the association tables' (tag_id, article_id) and
+    # (category_id, article_id) indexes cover these lookups
+    tag_name = Tag.clean_tag_name(request.args.get('tag', ''))
+    if tag_name:
+        query = query.filter(Article.id.in_(
+            select(article_tags.c.article_id).join(
+                Tag, Tag.id == article_tags.c.tag_id).where(Tag.name == tag_name)))
+    category_name = request.args.get('category', '').lower().strip()
+    if category_name:
+        query = query.filter(Article.id.in_(
+            select(article_categories.c.article_id).join(
+                Category, Category.id == article_categories.c.category_id).where(
+                    Category.name == category_name)))
 
     # Apply search if provided
     if search_query:
@@ -467,29 +511,45 @@ def summaries():
     # Paginate results
     articles = query.paginate(page=page, per_page=per_page, error_out=False)
 
-    # Convert markdown to HTML for summaries and critiques
-    for article in articles.items:
-        if article.summary:
-            article.summary = convert_markdown_to_html(article.summary)
-        if article.critique:
-            article.critique = convert_markdown_to_html(article.critique)
+    # Markdown is rendered into the views, never into the ORM objects
+    return render_template('summaries.html',
+                           articles=articles,
+                           selected_tag=tag_name,
+                           selected_category=category_name,
+                           article_views=article_views(
+                               articles.items,
+                               render=convert_markdown_to_html))
+
 
-    return render_template('summaries.html', articles=articles)
+@bp.route('/tags')
+@login_required
+def tags():
+    return render_template('topics.html',
+                           kind='tag',
+                           topics=top_tags(current_user.id))
 
 
-@app.route('/logout')
+@bp.route('/categories')
+@login_required
+def categories():
+    return render_template('topics.html',
+                           kind='category',
+                           topics=top_categories(current_user.id))
+
+
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 
-@app.route('/admin/send-daily-digest')
+@bp.route('/admin/send-daily-digest')
 @login_required
 def admin_send_daily_digest():
     if current_user.type != 'admin':  # Only allow users with admin type to trigger this
         flash('Unauthorized')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     try:
         send_daily_digest_with_context()
@@ -498,15 +558,15 @@ def admin_send_daily_digest():
         logger.error(f"Error sending daily digest: {str(e)}")
         flash(f'Error sending daily digest: {str(e)}')
     
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
 
-@app.route('/admin/send-weekly-digest')
+@bp.route('/admin/send-weekly-digest')
 @login_required
 def admin_send_weekly_digest():
     if current_user.type != 'admin':  # Only allow users with admin type to trigger this
         flash('Unauthorized')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     try:
         send_weekly_digest_with_context()
@@ -515,10 +575,22 @@ def admin_send_weekly_digest():
         logger.error(f"Error sending weekly digest: {str(e)}")
         flash(f'Error sending weekly digest: {str(e)}')
     
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
+
+
+@bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint for feed processing and LLM metrics."""
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return make_response('Unauthorized', 401)
 
+    response = make_response(render_metrics(), 200)
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
 
-@app.route('/api/webhook', methods=['POST', 'GET'])
+
+@bp.route('/api/webhook', methods=['POST', 'GET'])
 def webhook_feed_updated():
     """Endpoint for receiving webhook notifications when a feed is updated."""
     if request.method == 'GET':
@@ -535,18 +607,8 @@ def webhook_feed_updated():
 
     if request.method == 'POST':
         try:
-            # Verify the webhook signature
-            if not verify_webhook_signature(request.headers, request.data):
-                logger.warning("Invalid webhook signature")
-                response = jsonify({
-                    'status': 'error',
-                    'message': 'Invalid signature'
-                })
-                return make_response(response, 401)
-
             # Parse the request data
-            data = request.json
-            logger.info(f"Received webhook notification: {data}")
+            data = request.get_json(silent=True) or {}
 
             # Extract the feed URL from the webhook payload
             feed_url = data.get('topic')
@@ -558,9 +620,31 @@ def webhook_feed_updated():
                 })
                 return make_response(response, 400)
 
-            # Find the feed in the database
-            feed = Feed.query.filter_by(url=feed_url).first()
-            if not feed:
+            # Verify the signature with the topic's secret before doing any work
+            subscription = WebhookSubscription.query.filter_by(topic=feed_url).first()
+            secret = subscription.secret if subscription else None
+            if not verify_webhook_signature(secret, request.headers, request.get_data()):
+                logger.warning(f"Invalid webhook signature for topic: {feed_url}")
+                response = jsonify({
+                    'status': 'error',
+                    'message': 'Invalid signature'
+                })
+                return make_response(response, 401)
+
+            # Hubs retry deliveries; the same one is only processed once
+            if is_duplicate_delivery(feed_url, request.get_data()):
+                logger.info(f"Ignoring repeated webhook delivery for topic: {feed_url}")
+                response = jsonify({
+                    'status': 'success',
+                    'message': 'Duplicate delivery ignored'
+                })
+                return make_response(response, 200)
+
+            logger.info(f"Received webhook notification: {data}")
+
+            # Every feed with this URL shares the subscription
+            feeds = Feed.query.filter_by(url=feed_url, deleted_at=None).all()
+            if not feeds:
                 logger.warning(
                     f"Received webhook for unknown feed: {feed_url}")
                 response = jsonify({
@@ -570,10 +654,10 @@ def webhook_feed_updated():
                 return make_response(response, 404)
 
             logger.info(
-                f"Processing webhook for feed: {feed.title} (ID: {feed.id})")
+                f"Processing webhook for feeds {[feed.id for feed in feeds]}: {feed_url}")
 
-            # Process the feed (with webhook_triggered=True to handle it differently if needed)
-            process_feeds([feed], webhook_triggered=True)
+            # Process the feeds (with webhook_triggered=True to handle them differently if needed)
+            process_feeds(feeds, webhook_triggered=True)
 
             response = jsonify({
                 'status': 'success',
@@ -0,0 +1,276 @@
+"""Background scheduler and its bootstrap.
+
+Importing this module only builds the (stopped) scheduler. start_scheduler()
+registers the monitoring listeners, starts it and schedules the periodic
+tasks, once per process; main.py calls it explicitly and the app calls it
+on the first request otherwise.
+"""
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.events import (
+    EVENT_JOB_ERROR, EVENT_JOB_MISSED, EVENT_JOB_EXECUTED,
+    EVENT_JOB_SUBMITTED, EVENT_JOB_MAX_INSTANCES
+)
+from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.triggers.cron import CronTrigger
+from metrics import Gauge, SCHEDULER_JOBS_RUNNING
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_AUTOSTART = os.environ.get('SCHEDULER_AUTOSTART', 'true').lower() in ('1', 'true', 'yes')
+
+_scheduler_lock = threading.Lock()
+_scheduler_started = False
+
+# Initialize scheduler with optimized settings
+scheduler = BackgroundScheduler({
+    'apscheduler.jobstores.default': {
+        'type': 'memory'
+    },
+    'apscheduler.executors.default': {
+        'class': 'apscheduler.executors.pool:ThreadPoolExecutor',
+        'max_workers': 20
+    },
+    'apscheduler.job_defaults': {
+        'coalesce': True,
+        'max_instances': 3,
+        'misfire_grace_time': 1800
+    },
+    'apscheduler.timezone': 'UTC'
+})
+
+def count_due_jobs():
+    """Number of scheduled jobs whose run time has passed but have not started."""
+    now = datetime.now().astimezone()
+    return sum(1 for job in scheduler.get_jobs()
+               if job.next_run_time and job.next_run_time <= now)
+
+
+Gauge('scheduler_jobs_scheduled', 'Jobs currently known to the scheduler',
+      callback=lambda: len(scheduler.get_jobs()))
+Gauge('scheduler_queue_depth', 'Scheduled jobs that are due but not yet started',
+      callback=count_due_jobs)
+
+
+def track_running_jobs(event):
+    """Keep the running jobs gauge in step with executor submissions."""
+    if event.code == EVENT_JOB_SUBMITTED:
+        SCHEDULER_JOBS_RUNNING.inc()
+    else:
+        SCHEDULER_JOBS_RUNNING.dec()
+
+
+def monitor_job_states():
+    """Monitor and log current state of all jobs."""
+    try:
+        jobs = scheduler.get_jobs()
+        logger.info(f"Current scheduler state - Active jobs: {len(jobs)}")
+
+        for job in jobs:
+            next_run = job.next_run_time
+            if next_run:
+                # Convert to UTC for consistent comparison
+                current_time = datetime.now(next_run.tzinfo)
+                time_until_next = (next_run - current_time).total_seconds()
+            else:
+                time_until_next = None
+
+            logger.info(
+                f"Job: {job.id}\n"
+                f"  State: {'Running' if job.pending else 'Waiting'}\n"
+                f"  Next run: {next_run}\n"
+                f"  Time until next run: {time_until_next:.0f}s" if time_until_next else "N/A"
+            )
+
+    except Exception as e:
+        logger.error(f"Error monitoring job states: {str(e)}")
+
+def cleanup_stale_jobs():
+    """Clean up any stale or zombie jobs."""
+    try:
+        jobs = scheduler.get_jobs()
+        
+        for job in jobs:
+            if hasattr(job, 'next_run_time') and job.next_run_time:
+                # Get current time with the same timezone as job's next_run_time
+                current_time = datetime.now(job.next_run_time.tzinfo)
+                
+                time_diff = current_time - job.next_run_time
+                if time_diff > timedelta(hours=1):
+                    logger.warning(f"Found stale job {job.id}, removing and rescheduling")
+                    try:
+                        scheduler.remove_job(job.id)
+                        if isinstance(job.trigger, (IntervalTrigger, CronTrigger)):
+                            # Use timezone-aware datetime for new job
+                            scheduler.add_job(
+                                func=job.func,
+                                trigger=job.trigger,
+                                id=job.id,
+                                name=job.name,
+                                misfire_grace_time=1800,
+                                coalesce=True,
+                                next_run_time=datetime.now(job.next_run_time.tzinfo) + timedelta(minutes=5)
+                            )
+                    except Exception as e:
+                        logger.error(f"Error cleaning up stale job {job.id}: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error in cleanup_stale_jobs: {str(e)}")
+
+def handle_max_instances(event):
+    """Handle cases where jobs hit max instances limit."""
+    logger.warning(f"Job {event.job_id} hit maximum instances limit")
+    try:
+        job = scheduler.get_job(event.job_id)
+        if job:
+            logger.info(
+                f"Max instances hit for job:\n"
+                f"  Name: {job.name}\n"
+                f"  Max instances: {job.max_instances}\n"
+                f"  Next run: {job.next_run_time}"
+            )
+            # Force cleanup of any stuck instances
+            cleanup_stale_jobs()
+    except Exception as e:
+        logger.error(f"Error handling max instances event: {str(e)}")
+
+def handle_scheduler_error(event):
+    """Enhanced error handler for scheduler job failures."""
+    logger.error(f"Scheduler error: Job {event.job_id} failed with {event.exception}")
+
+    try:
+        cleanup_stale_jobs()
+        job = scheduler.get_job(event.job_id)
+        if job:
+            logger.error(
+                f"Failed job details:\n"
+                f"  Name: {job.name}\n"
+                f"  Trigger: {job.trigger}\n"
+                f"  Next run: {job.next_run_time}\n"
+                f"  Function: {job.func.__name__}"
+            )
+
+            if not job.next_run_time:
+                new_run_time = datetime.now() + timedelta(minutes=5)
+                try:
+                    scheduler.reschedule_job(
+                        job_id=event.job_id,
+                        trigger='date',
+                        run_date=new_run_time
+                    )
+                    logger.info(f"Rescheduled failed job {event.job_id} for {new_run_time}")
+                except Exception as e:
+                    logger.error(f"Failed to reschedule job {event.job_id}: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error handling job failure for {event.job_id}: {str(e)}")
+
+def handle_job_executed(event):
+    """Monitor successful job executions with enhanced tracking."""
+    try:
+        job = scheduler.get_job(event.job_id)
+        if job:
+            runtime = getattr(event, 'retval', 0) or 0
+            logger.info(
+                f"Job completed successfully:\n"
+                f"  ID: {event.job_id}\n"
+                f"  Runtime: {runtime:.2f}s\n"
+                f"  Next run: {job.next_run_time}\n"
+                f"  Function: {job.func.__name__}"
+            )
+
+            # Monitor job states after successful execution
+            monitor_job_states()
+    except Exception as e:
+        logger.error(f"Error handling job execution event: {str(e)}")
+
+def handle_job_missed(event):
+    """Handle missed job executions with recovery."""
+    logger.warning(f"Job missed: {event.job_id} scheduled at {event.scheduled_run_time}")
+
+    try:
+        cleanup_stale_jobs()
+        job = scheduler.get_job(event.job_id)
+        if job:
+            logger.warning(
+                f"Missed job details:\n"
+                f"  Name: {job.name}\n"
+                f"  Trigger: {job.trigger}\n"
+                f"  Scheduled time: {event.scheduled_run_time}"
+            )
+
+            if not job.next_run_time:
+                if isinstance(job.trigger, IntervalTrigger):
+                    next_run = datetime.now() + timedelta(minutes=1)
+                elif isinstance(job.trigger, CronTrigger):
+                    next_run = job.trigger.get_next_fire_time(None, event.scheduled_run_time)
+                else:
+                    next_run = datetime.now() + timedelta(minutes=5)
+
+                try:
+                    scheduler.reschedule_job(
+                        job_id=event.job_id,
+                        trigger='date',
+                        run_date=next_run
+                    )
+                    logger.info(f"Rescheduled missed job {event.job_id} for {next_run}")
+                except Exception as e:
+                    logger.error(f"Failed to reschedule missed job: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error handling missed job: {str(e)}")
+
+
+def start_scheduler():
+    """Start the scheduler and its jobs once per process.
+
+    Safe to call repeatedly; only the first call does any work.
+    """
+    global _scheduler_started
+    with _scheduler_lock:
+        if _scheduler_started:
+            return
+        _scheduler_started = True
+
+        from app import get_app
+        from feed_processor import schedule_tasks
+
+        # Add comprehensive scheduler event monitoring
+        scheduler.add_listener(handle_scheduler_error, EVENT_JOB_ERROR)
+        scheduler.add_listener(handle_job_missed, EVENT_JOB_MISSED)
+        scheduler.add_listener(handle_job_executed, EVENT_JOB_EXECUTED)
+        scheduler.add_listener(handle_max_instances, EVENT_JOB_MAX_INSTANCES)
+        scheduler.add_listener(
+            track_running_jobs,
+            EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+
+        # Schedule monitoring job
+        scheduler.add_job(
+            monitor_job_states,
+            trigger='interval',
+            minutes=5,
+            id='monitor_job_states',
+            coalesce=True,
+            max_instances=1,
+            replace_existing=True
+        )
+
+        try:
+            scheduler.start()
+            with get_app().app_context():
+                schedule_tasks()
+            logger.info("Scheduler started and tasks scheduled")
+        except Exception as e:
+            logger.error(f"Scheduler initialization failed: {str(e)}")
+            if scheduler.running:
+                scheduler.shutdown(wait=False)
+            raise
+
+        atexit.register(lambda: scheduler.shutdown(wait=False) if scheduler.running else None)
+
+
+def start_scheduler_on_first_request():
+    """before_request hook for servers that do not go through main.py."""
+    if not _scheduler_started and SCHEDULER_AUTOSTART:
+        start_scheduler()
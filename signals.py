@@ -0,0 +1,53 @@
+"""Signals sent when a user's account, feeds or articles change.
+
+Changes are queued on the session with content_changed() or
+account_changed() and the signals are sent only after the session commits,
+so receivers never act on changes that are rolled back or not yet visible to
+other sessions. Signals are delivered within the current process only.
+"""
+from blinker import Namespace
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+
+_signals = Namespace()
+
+# Sent with user_ids=set of ids after a commit that changed their content
+user_content_changed = _signals.signal('user-content-changed')
+# Sent with user_ids=set of ids after a commit that updated or deleted them
+user_account_changed = _signals.signal('user-account-changed')
+
+_QUEUES = {
+    'changed_user_ids': user_content_changed,
+    'changed_account_ids': user_account_changed,
+}
+
+
+def _queue(key, user_ids, session=None):
+    session = session or db.session
+    session.info.setdefault(key, set()).update(user_ids)
+
+
+def content_changed(user_ids, session=None):
+    """Queue a user_content_changed signal for the session's commit."""
+    _queue('changed_user_ids', user_ids, session)
+
+
+def account_changed(user_ids, session=None):
+    """Queue a user_account_changed signal for the session's commit."""
+    _queue('changed_account_ids', user_ids, session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _send_after_commit(session):
+    for key, signal in _QUEUES.items():
+        user_ids = session.info.pop(key, None)
+        if user_ids:
+            signal.send(None, user_ids=user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    for key in _QUEUES:
+        session.info.pop(key, None)
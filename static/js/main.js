@@ -18,6 +18,63 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Poll the progress of running OPML imports
+    document.querySelectorAll('[data-import-status]').forEach(card => {
+        const bar = card.querySelector('.progress-bar');
+        const text = card.querySelector('.import-progress-text');
+        const poll = function() {
+            fetch(card.dataset.importStatus)
+                .then(response => response.json())
+                .then(job => {
+                    bar.style.width = job.percent + '%';
+                    bar.setAttribute('aria-valuenow', job.percent);
+                    text.textContent = job.fetched + ' of ' + job.imported + ' new feeds fetched';
+                    if (job.status === 'completed') {
+                        // Show the fetched feeds
+                        window.location.reload();
+                    } else {
+                        setTimeout(poll, 5000);
+                    }
+                })
+                .catch(() => setTimeout(poll, 15000));
+        };
+        setTimeout(poll, 5000);
+    });
+
+    // Poll new feeds until their first fetch has finished
+    document.querySelectorAll('[data-feed-status]').forEach(row => {
+        let delay = 2000;
+        const poll = function() {
+            fetch(row.dataset.feedStatus)
+                .then(response => response.json())
+                .then(feed => {
+                    if (feed.status === 'pending') {
+                        // Back off for feeds that take long, up to a minute
+                        delay = Math.min(delay * 2, 60000);
+                        setTimeout(poll, delay);
+                        return;
+                    }
+                    row.querySelector('.feed-title').textContent = feed.title || 'Untitled';
+                    if (feed.last_checked) {
+                        row.querySelector('.feed-last-checked').textContent =
+                            feed.last_checked.slice(0, 16).replace('T', ' ');
+                    }
+                    const badge = document.createElement('span');
+                    if (feed.status === 'active') {
+                        badge.className = 'badge bg-success';
+                        badge.textContent = 'Active';
+                    } else {
+                        badge.className = 'badge bg-danger';
+                        badge.textContent = 'Error';
+                        badge.title = feed.error_message || '';
+                    }
+                    row.querySelector('.feed-status').replaceChildren(badge);
+                })
+                .catch(() => setTimeout(poll, 60000));
+        };
+        setTimeout(poll, delay);
+    });
+
     // Confirm delete actions
     const deleteButtons = document.querySelectorAll('[data-confirm]');
     deleteButtons.forEach(button => {
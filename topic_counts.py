@@ -0,0 +1,155 @@
+"""Per-user tag and category counts for the topic browse pages.
+
+user_tag_count and user_category_count hold the number of each user's
+articles per tag and category, so the browse pages read a few rows instead
+of joining every article of the user to the association tables. Copies of a
+story from another feed (duplicate_of_id set) are not counted, matching the
+article lists.
+
+Counts are incremented as summaries are stored and decremented, batch by
+batch, for the articles retention pruning removes. Purging a deleted feed
+rebuilds the counts of its owner with rebuild_topic_counts; until then the
+counts still include the feed, while the article lists already hide it.
+"""
+import logging
+from collections import Counter
+
+from sqlalchemy import bindparam, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import joinedload
+
+from app import db
+from models import (Feed, Article, UserTagCount, UserCategoryCount,
+                    article_tags, article_categories)
+
+logger = logging.getLogger(__name__)
+
+_UPSERT_DIALECTS = {'postgresql': postgresql, 'sqlite': sqlite}
+
+
+def _upsert_counts(model, key_column, rows):
+    """Add each row's article_count to the stored count, creating missing rows."""
+    if not rows:
+        return
+    dialect = _UPSERT_DIALECTS[db.session.get_bind().dialect.name]
+    stmt = dialect.insert(model)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=['user_id', key_column],
+            set_={'article_count': model.article_count + stmt.excluded.article_count}),
+        rows)
+
+
+def _increment(model, key_column, user_id, ids):
+    _upsert_counts(model, key_column, [
+        {'user_id': user_id, key_column: key, 'article_count': count}
+        for key, count in Counter(ids).items()])
+
+
+def _counts_of_articles(association, key_column, article_ids, include_duplicates):
+    """(user id, key, article count) of the given articles that are counted."""
+    key = association.c[key_column]
+    conditions = [association.c.article_id.in_(article_ids), Feed.deleted_at.is_(None)]
+    if not include_duplicates:
+        conditions.append(Article.duplicate_of_id.is_(None))
+    return db.session.execute(
+        select(Feed.user_id, key, func.count()).select_from(association).join(
+            Article, Article.id == association.c.article_id).join(
+                Feed, Article.feed_id == Feed.id).where(*conditions).group_by(
+                    Feed.user_id, key)).all()
+
+
+def _decrement(model, key_column, association, article_ids):
+    counts = _counts_of_articles(association, key_column, article_ids, False)
+    if not counts:
+        return
+    table = model.__table__
+    db.session.execute(
+        table.update().where(table.c.user_id == bindparam('_user_id'),
+                             table.c[key_column] == bindparam('_key')).values(
+            article_count=table.c.article_count - bindparam('_count')),
+        [{'_user_id': user_id, '_key': value, '_count': count}
+         for user_id, value, count in counts])
+    db.session.execute(table.delete().where(
+        table.c.user_id.in_({user_id for user_id, _, _ in counts}),
+        table.c.article_count <= 0))
+
+
+def _promote(model, key_column, association, article_ids):
+    _upsert_counts(model, key_column, [
+        {'user_id': user_id, key_column: value, 'article_count': count}
+        for user_id, value, count in _counts_of_articles(
+            association, key_column, article_ids, True)])
+
+
+def remove_article_topics(article_ids):
+    """Uncount articles that are about to be deleted; the caller commits.
+
+    Copies of the removed articles in other feeds become originals once
+    their duplicate_of_id is cleared, so they are counted instead. Only the
+    given articles and their copies are aggregated.
+    """
+    if not article_ids:
+        return
+    copy_ids = [article_id for (article_id, ) in db.session.query(Article.id).filter(
+        Article.duplicate_of_id.in_(article_ids), Article.id.notin_(article_ids))]
+    for model, key_column, association in (
+            (UserTagCount, 'tag_id', article_tags),
+            (UserCategoryCount, 'category_id', article_categories)):
+        _decrement(model, key_column, association, article_ids)
+        if copy_ids:
+            _promote(model, key_column, association, copy_ids)
+
+
+def add_article_topics(user_id, tag_ids, category_ids):
+    """Count a new summarized article of the user; the caller commits."""
+    _increment(UserTagCount, 'tag_id', user_id, tag_ids)
+    _increment(UserCategoryCount, 'category_id', user_id, category_ids)
+
+
+def _rebuild(model, key_column, association, user_ids):
+    db.session.execute(model.__table__.delete().where(model.user_id.in_(user_ids)))
+    key = association.c[key_column]
+    db.session.execute(
+        insert(model).from_select(
+            ['user_id', key_column, 'article_count'],
+            select(Feed.user_id, key, func.count()).select_from(association).join(
+                Article, Article.id == association.c.article_id).join(
+                    Feed, Article.feed_id == Feed.id).where(
+                        Feed.user_id.in_(user_ids),
+                        Feed.deleted_at.is_(None),
+                        Article.duplicate_of_id.is_(None)).group_by(Feed.user_id, key)))
+
+
+def rebuild_topic_counts(user_ids):
+    """Recount the tags and categories of these users; the caller commits."""
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return
+    _rebuild(UserTagCount, 'tag_id', article_tags, user_ids)
+    _rebuild(UserCategoryCount, 'category_id', article_categories, user_ids)
+    logger.debug(f"Rebuilt topic counts of {len(user_ids)} users")
+
+
+def top_tags(user_id, limit=None):
+    """(Tag, article count) pairs of the user, most used first."""
+    query = db.session.query(UserTagCount).filter(
+        UserTagCount.user_id == user_id, UserTagCount.article_count > 0).options(
+            joinedload(UserTagCount.tag)).order_by(
+                UserTagCount.article_count.desc(), UserTagCount.tag_id)
+    if limit:
+        query = query.limit(limit)
+    return [(row.tag, row.article_count) for row in query]
+
+
+def top_categories(user_id, limit=None):
+    """(Category, article count) pairs of the user, most used first."""
+    query = db.session.query(UserCategoryCount).filter(
+        UserCategoryCount.user_id == user_id,
+        UserCategoryCount.article_count > 0).options(
+            joinedload(UserCategoryCount.category)).order_by(
+                UserCategoryCount.article_count.desc(),
+                UserCategoryCount.category_id)
+    if limit:
+        query = query.limit(limit)
+    return [(row.category, row.article_count) for row in query]
@@ -0,0 +1,97 @@
+"""Flask-Login user loader backed by a per-process user cache.
+
+Every authenticated request loads its user. The column values of recently
+seen users are cached for USER_CACHE_TTL seconds, and on a hit the User is
+rebuilt from them and attached to the session without a query; relationships
+still load lazily as usual. Any committed update or deletion of a User
+through the ORM (password, settings, verification) drops its entry, see
+signals.py. Other processes do not see that signal, so there the TTL bounds
+how long an old snapshot can be used.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached, object_session
+
+from app import db, login_manager
+from models import User
+from signals import account_changed, user_account_changed
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))  # seconds
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1000))
+
+_COLUMNS = [attr.key for attr in inspect(User).column_attrs]
+
+_cache = OrderedDict()  # user id -> (expiry, column values)
+# Bumped on invalidation so a load that raced with a change is not stored
+_generations = {}
+_lock = threading.Lock()
+
+
+def _cached_values(user_id):
+    with _lock:
+        cached = _cache.get(user_id)
+        if cached is None:
+            return None, _generations.get(user_id, 0)
+        if cached[0] <= time.monotonic():
+            del _cache[user_id]
+            return None, _generations.get(user_id, 0)
+        _cache.move_to_end(user_id)
+        return cached[1], None
+
+
+def _store(user_id, values, generation):
+    with _lock:
+        if _generations.get(user_id, 0) != generation:
+            return
+        _cache[user_id] = (time.monotonic() + USER_CACHE_TTL, values)
+        _cache.move_to_end(user_id)
+        while len(_cache) > USER_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def invalidate(user_ids):
+    with _lock:
+        for user_id in user_ids:
+            _cache.pop(user_id, None)
+            _generations[user_id] = _generations.get(user_id, 0) + 1
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    if USER_CACHE_TTL <= 0:
+        return db.session.get(User, user_id)
+
+    values, generation = _cached_values(user_id)
+    if values is not None:
+        user = User(**values)
+        make_transient_to_detached(user)
+        # Reuses the session's instance if this user is already loaded
+        return db.session.merge(user, load=False)
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        _store(user_id, {key: getattr(user, key) for key in _COLUMNS}, generation)
+    return user
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _queue_account_changed(mapper, connection, target):
+    account_changed([target.id], object_session(target))
+
+
+@user_account_changed.connect
+def _on_user_account_changed(sender, user_ids=(), **kwargs):
+    invalidate(user_ids)
@@ -0,0 +1,181 @@
+"""Reconciliation of hub webhook subscriptions with the feeds in the database.
+
+Every distinct feed URL (topic) gets one row in webhook_subscription, shared
+by all feeds with that URL. reconcile_webhooks runs on a schedule and:
+
+1. adds rows for topics that have none, in one statement;
+2. registers topics without a subscription or without a secret with the
+   hub, WEBHOOK_REGISTRATION_CONCURRENCY at a time, retrying failures after
+   WEBHOOK_RETRY_INTERVAL; each registration gets a new random secret;
+3. writes the new ids and secrets back in bulk and copies the ids to
+   Feed.webhook_id;
+4. unregisters subscriptions whose topic no longer has a live feed.
+
+Only the hub calls run in worker threads; all database work stays on the
+calling thread.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, exists, insert, or_, select, update
+
+from app import db
+from models import Feed, WebhookSubscription
+from webhook_service import (register_webhook, unregister_webhook, generate_callback_url,
+                             generate_webhook_secret)
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_RECONCILE_INTERVAL = int(os.environ.get('WEBHOOK_RECONCILE_INTERVAL', 600))  # seconds
+WEBHOOK_RECONCILE_BATCH_SIZE = int(os.environ.get('WEBHOOK_RECONCILE_BATCH_SIZE', 100))
+WEBHOOK_REGISTRATION_CONCURRENCY = int(os.environ.get('WEBHOOK_REGISTRATION_CONCURRENCY', 4))
+WEBHOOK_RETRY_INTERVAL = int(os.environ.get('WEBHOOK_RETRY_INTERVAL', 6 * 3600))  # seconds
+
+
+def _live_feed(topic_column):
+    return exists().where(Feed.url == topic_column, Feed.deleted_at.is_(None))
+
+
+def _add_missing_topics():
+    db.session.execute(
+        insert(WebhookSubscription).from_select(
+            ['topic'],
+            select(Feed.url).where(
+                Feed.deleted_at.is_(None),
+                ~exists().where(WebhookSubscription.topic == Feed.url)).distinct()))
+
+
+def _sync_feed_webhook_ids():
+    """Copy subscription ids to the feeds of their topic that lack them."""
+    subscription_id = select(WebhookSubscription.subscription_id).where(
+        WebhookSubscription.topic == Feed.url).scalar_subquery()
+    db.session.execute(
+        update(Feed).where(
+            exists().where(WebhookSubscription.topic == Feed.url,
+                           WebhookSubscription.subscription_id.isnot(None),
+                           or_(Feed.webhook_id.is_(None),
+                               Feed.webhook_id != WebhookSubscription.subscription_id))).values(
+                                   webhook_id=subscription_id),
+        execution_options={'synchronize_session': False})
+
+
+def register_missing_webhooks(callback_url, batch_size=WEBHOOK_RECONCILE_BATCH_SIZE,
+                              concurrency=WEBHOOK_REGISTRATION_CONCURRENCY):
+    """Register up to batch_size topics without a subscription or secret.
+
+    Returns:
+        int: The number of topics registered.
+    """
+    now = datetime.utcnow()
+    _add_missing_topics()
+    pending = db.session.query(WebhookSubscription.id, WebhookSubscription.topic,
+                               WebhookSubscription.subscription_id).filter(
+        or_(WebhookSubscription.subscription_id.is_(None),
+            WebhookSubscription.secret.is_(None)),
+        _live_feed(WebhookSubscription.topic),
+        or_(WebhookSubscription.last_attempt_at.is_(None),
+            WebhookSubscription.last_attempt_at < now - timedelta(
+                seconds=WEBHOOK_RETRY_INTERVAL))).order_by(
+                    WebhookSubscription.last_attempt_at.asc().nullsfirst(),
+                    WebhookSubscription.id).limit(batch_size).all()
+    db.session.commit()
+    if not pending:
+        return 0
+
+    new_secrets = [generate_webhook_secret() for _ in pending]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        responses = list(pool.map(
+            lambda row, secret: register_webhook(row.topic, callback_url, secret),
+            pending, new_secrets))
+
+    rows = []
+    replaced = []
+    for row, secret, response in zip(pending, new_secrets, responses):
+        subscription_id = (response or {}).get('subscriptionId')
+        if subscription_id:
+            rows.append({
+                'id': row.id,
+                'subscription_id': subscription_id,
+                'secret': secret,
+                'registered_at': now,
+                'last_attempt_at': now,
+                'last_error': None,
+            })
+            if row.subscription_id and row.subscription_id != subscription_id:
+                replaced.append(row.subscription_id)
+        else:
+            # A subscription without a secret keeps its id until replaced
+            rows.append({
+                'id': row.id,
+                'last_attempt_at': now,
+                'last_error': 'Registration failed',
+            })
+
+    try:
+        db.session.execute(update(WebhookSubscription), rows)
+        _sync_feed_webhook_ids()
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Error saving webhook subscriptions: {str(e)}")
+        db.session.rollback()
+        raise
+
+    for subscription_id in replaced:
+        unregister_webhook(subscription_id)
+
+    registered = sum(1 for row in rows if row.get('subscription_id'))
+    logger.info(
+        f"Registered {registered} of {len(rows)} webhook subscriptions")
+    return registered
+
+
+def prune_orphaned_webhooks(batch_size=WEBHOOK_RECONCILE_BATCH_SIZE,
+                            concurrency=WEBHOOK_REGISTRATION_CONCURRENCY):
+    """Unregister subscriptions whose topic has no live feed left.
+
+    Subscriptions the hub fails to remove are kept and retried on the next run.
+
+    Returns:
+        int: The number of subscriptions removed.
+    """
+    orphans = db.session.query(WebhookSubscription.id,
+                               WebhookSubscription.subscription_id).filter(
+        ~_live_feed(WebhookSubscription.topic)).order_by(
+            WebhookSubscription.id).limit(batch_size).all()
+    db.session.commit()
+    if not orphans:
+        return 0
+
+    registered = [row for row in orphans if row.subscription_id]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(
+            lambda row: unregister_webhook(row.subscription_id), registered))
+    removed_ids = [row.id for row in orphans if not row.subscription_id] + [
+        row.id for row, ok in zip(registered, results) if ok]
+
+    if removed_ids:
+        try:
+            db.session.execute(
+                delete(WebhookSubscription).where(
+                    WebhookSubscription.id.in_(removed_ids)),
+                execution_options={'synchronize_session': False})
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error deleting webhook subscriptions: {str(e)}")
+            db.session.rollback()
+            raise
+
+    logger.info(
+        f"Removed {len(removed_ids)} of {len(orphans)} orphaned webhook subscriptions")
+    return len(removed_ids)
+
+
+def reconcile_webhooks():
+    """Register missing webhook subscriptions and remove orphaned ones."""
+    app_url = os.environ.get('APPLICATION_URL', 'https://tldr.express')
+    return {
+        'registered': register_missing_webhooks(generate_callback_url(app_url)),
+        'pruned': prune_orphaned_webhooks(),
+    }
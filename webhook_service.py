@@ -1,7 +1,12 @@
+import hashlib
+import hmac
 import logging
 import requests
-import uuid
+import secrets
 import os
+import threading
+import time
+from collections import OrderedDict
 from urllib.parse import urljoin, urlparse
 
 logger = logging.getLogger(__name__)
@@ -9,6 +14,22 @@ logger = logging.getLogger(__name__)
 # SuperDuperFeeder API base URL
 FEEDER_BASE_URL = "https://superduperfeeder.deno.dev/api/"
 CALLBACK_URL = "https://tldr.express/api/webhook"
+WEBHOOK_REQUEST_TIMEOUT = int(os.environ.get('WEBHOOK_REQUEST_TIMEOUT', 15))  # seconds
+# Signed deliveries with the same topic and body within this many seconds
+# are ignored
+WEBHOOK_REPLAY_TTL = int(os.environ.get('WEBHOOK_REPLAY_TTL', 600))
+WEBHOOK_REPLAY_CACHE_SIZE = int(os.environ.get('WEBHOOK_REPLAY_CACHE_SIZE', 10000))
+
+# Algorithms a hub may name in X-Hub-Signature ("sha256=<hex digest>")
+_SIGNATURE_ALGORITHMS = {
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+    'sha384': hashlib.sha384,
+    'sha512': hashlib.sha512,
+}
+
+_recent_deliveries = OrderedDict()  # hash of topic and body -> expiry
+_deliveries_lock = threading.Lock()
 
 
 def generate_callback_url(app_url):
@@ -18,12 +39,18 @@ def generate_callback_url(app_url):
     return urljoin(app_url, "/api/webhook")
 
 
-def register_webhook(feed_url, callback_url):
+def generate_webhook_secret():
+    """A new random secret for a webhook subscription."""
+    return secrets.token_hex(32)
+
+
+def register_webhook(feed_url, callback_url, secret):
     """Register a webhook for a feed with the SuperDuperFeeder webhook API.
     
     Args:
         feed_url: The URL of the RSS feed to monitor
         callback_url: The callback URL to ping when the feed is updated
+        secret: The key the hub signs its deliveries with
         
     Returns:
         dict: The response from the webhook service, containing at least a 'id' field
@@ -38,7 +65,7 @@ def register_webhook(feed_url, callback_url):
         form_data = {
             "topic": feed_url,
             "callback": callback_url,
-            "secret": os.environ.get("WEBHOOK_SECRET", str(uuid.uuid4()))
+            "secret": secret
         }
 
         headers = {
@@ -46,7 +73,10 @@ def register_webhook(feed_url, callback_url):
             'User-Agent': 'tldr.express'
         }
 
-        response = requests.post(endpoint, data=form_data, headers=headers)
+        response = requests.post(endpoint,
+                                 data=form_data,
+                                 headers=headers,
+                                 timeout=WEBHOOK_REQUEST_TIMEOUT)
         response.raise_for_status()
 
         webhook_data = response.json()
@@ -91,7 +121,7 @@ def unregister_webhook(webhook_id):
 
         endpoint = urljoin(FEEDER_BASE_URL, f"webhook/{webhook_id}")
 
-        response = requests.delete(endpoint)
+        response = requests.delete(endpoint, timeout=WEBHOOK_REQUEST_TIMEOUT)
         response.raise_for_status()
 
         logger.info(f"Successfully unregistered webhook (ID: {webhook_id})")
@@ -107,28 +137,54 @@ def unregister_webhook(webhook_id):
         return False
 
 
-def verify_webhook_signature(request_headers, request_body):
-    """Verify the signature of a webhook callback.
-    
-    This is a placeholder for future implementation of security verification.
-    When the SuperDuperFeeder service implements signature verification,
-    this function should be updated to verify the signature.
-    
+def verify_webhook_signature(secret, request_headers, request_body):
+    """Verify the HMAC signature of a webhook delivery.
+
+    The hub signs the raw body with the subscription's secret and sends
+    "<algorithm>=<hex digest>" in X-Hub-Signature (or X-Hub-Signature-256).
+
     Args:
+        secret: The secret the subscription was registered with
         request_headers: The headers of the webhook request
-        request_body: The body of the webhook request
-        
+        request_body: The raw body of the webhook request
+
     Returns:
-        bool: Always returns True for now
+        bool: True if the signature matches
     """
-    # TODO: Implement proper signature verification when SuperDuperFeeder adds support
-    logger.info(
-        "Webhook signature verification called (placeholder implementation)")
+    if not secret or not request_body:
+        return False
 
-    # For now, we're simply checking for the existence of the request body
-    if not request_body:
-        logger.warning("Empty request body in webhook call")
+    header = (request_headers.get('X-Hub-Signature')
+              or request_headers.get('X-Hub-Signature-256') or '')
+    algorithm, _, signature = header.strip().partition('=')
+    digestmod = _SIGNATURE_ALGORITHMS.get(algorithm.lower())
+    if not digestmod or not signature:
         return False
 
-    # Return True as we don't have actual signature verification yet
-    return True
+    expected = hmac.new(secret.encode(), request_body, digestmod).hexdigest()
+    return hmac.compare_digest(expected, signature.strip().lower())
+
+
+def is_duplicate_delivery(topic, request_body):
+    """Record a verified delivery and tell whether it was already seen.
+
+    The hub's signature covers only the body, so deliveries are keyed on the
+    topic and a hash of the signed body; headers such as delivery ids or
+    timestamps are unsigned and could be changed to replay a captured body.
+    Deliveries are remembered for WEBHOOK_REPLAY_TTL seconds, at most
+    WEBHOOK_REPLAY_CACHE_SIZE of them, within the current process. A genuine
+    update whose body repeats a delivery from that window is dropped too;
+    the feed is still picked up by the regular processing cycle.
+    """
+    key = hashlib.sha256(topic.encode() + b'\0' +
+                         hashlib.sha256(request_body).digest()).digest()
+    now = time.monotonic()
+    with _deliveries_lock:
+        expiry = _recent_deliveries.get(key)
+        if expiry is not None and expiry > now:
+            return True
+        _recent_deliveries[key] = now + WEBHOOK_REPLAY_TTL
+        _recent_deliveries.move_to_end(key)
+        while len(_recent_deliveries) > WEBHOOK_REPLAY_CACHE_SIZE:
+            _recent_deliveries.popitem(last=False)
+    return False